@@ -0,0 +1,208 @@
+# Latency and throughput benchmarks over synthetic India-scale donor datasets
+#
+# Usage: python -m benchmarks.bench_suite [--sizes 1000,100000,1000000] [--output results.json]
+#                                         [--compare baseline.json] [--threshold 0.2] [--iterations 200]
+#
+# Runs in a temporary directory, so the real data files are never touched.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Default relative p50 slowdown against --compare that counts as a regression
+REGRESSION_THRESHOLD = 0.20
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+
+def summarise(samples, elapsed):
+    ordered = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+
+
+async def measure(operation, arguments, warmup=5):
+    """Run the coroutine function `operation` once per argument; returns the timing summary"""
+    for argument in arguments[:warmup]:
+        await operation(argument)
+    samples = []
+    started = time.perf_counter()
+    for argument in arguments:
+        start = time.perf_counter()
+        await operation(argument)
+        samples.append(time.perf_counter() - start)
+    return summarise(samples, time.perf_counter() - started)
+
+
+async def run_size(server, size, iterations, io_iterations):
+    from httpx import ASGITransport, AsyncClient
+
+    from benchmarks.synthetic import BLOOD_TYPE_FREQUENCIES, generate_donors
+
+    rng = random.Random(size)
+    hospitals = [(city, hospital["name"]) for city, entries in server.HOSPITALS.items() for hospital in entries]
+    blood_types = list(BLOOD_TYPE_FREQUENCIES)
+
+    start = time.perf_counter()
+    server.donor_store.load(generate_donors(size))
+    server.requests = []
+    server.change_feed.reset()
+    populate_seconds = time.perf_counter() - start
+    if server.STORAGE_BACKEND != "sqlite":
+        server.writer.start()
+
+    def search_arguments():
+        city, hospital_name = rng.choice(hospitals)
+        return {"blood_type": rng.choice(blood_types), "city": city, "hospital_name": hospital_name,
+                "radius_km": rng.choice((5, 10, 25)), "include_compatible": rng.random() < 0.5}
+
+    async def call_tool(arguments):
+        name, tool_arguments = arguments
+        await server.handle_call_tool(name, tool_arguments)
+
+    results = {"populate_seconds": round(populate_seconds, 3)}
+
+    results["find_nearby_donors"] = await measure(
+        call_tool, [("find_nearby_donors", search_arguments()) for _ in range(iterations)])
+
+    def registration(i):
+        city, hospital_name = rng.choice(hospitals)
+        return ("register_blood_donor", {"name": f"Bench {i}", "blood_type": rng.choice(blood_types),
+                                         "city": city, "hospital_name": hospital_name, "phone": f"8{i:09d}"})
+    results["register_blood_donor"] = await measure(call_tool, [registration(i) for i in range(iterations)])
+
+    results["list_donors_offset"] = await measure(
+        call_tool, [("list_donors", {"start_index": rng.randrange(size), "limit": 10}) for _ in range(iterations)])
+    results["list_donors_filtered"] = await measure(
+        call_tool, [("list_donors", {"city": rng.choice(hospitals)[0], "blood_type": rng.choice(blood_types), "limit": 10})
+                    for _ in range(iterations)])
+
+    # Exact names, partial names and misspellings, as users type them
+    queries = []
+    for _ in range(iterations * 5):
+        city, hospital_name = rng.choice(hospitals)
+        variant = rng.choice((hospital_name, hospital_name.split()[0], hospital_name.lower()[:-2] + "xx"))
+        queries.append((variant, city))
+
+    async def find_hospital(query):
+        server.find_hospital_by_name(*query)
+    results["find_hospital_by_name"] = await measure(find_hospital, queries)
+
+    async def save(_):
+        await asyncio.to_thread(server.save_data)
+    results["save_data"] = await measure(save, [None] * io_iterations, warmup=0)
+
+    async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://bench") as client:
+        async def mcp_call(body):
+            response = await client.post("/mcp", json=body)
+            response.raise_for_status()
+        bodies = [{"jsonrpc": "2.0", "id": i, "method": "tools/call",
+                   "params": {"name": "find_nearby_donors", "arguments": search_arguments()}} for i in range(iterations)]
+        results["mcp_find_nearby_donors"] = await measure(mcp_call, bodies)
+        results["mcp_tools_list"] = await measure(
+            mcp_call, [{"jsonrpc": "2.0", "id": i, "method": "tools/list"} for i in range(iterations)])
+
+    if server.STORAGE_BACKEND != "sqlite":
+        server.writer.close()
+
+    async def load(_):
+        server.load_data()
+    results["load_data"] = await measure(load, [None] * io_iterations, warmup=0)
+    return results
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print p50 changes against a previous run; returns the number of regressions"""
+    regressions = 0
+    for size, operations in current["results"].items():
+        previous = baseline.get("results", {}).get(size, {})
+        for operation, summary in operations.items():
+            if not isinstance(summary, dict) or operation not in previous:
+                continue
+            before, after = previous[operation]["p50_ms"], summary["p50_ms"]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{size:>9} {operation:<24} p50 {before:>10.3f} -> {after:>10.3f} ms ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the blood donor server over synthetic datasets")
+    parser.add_argument("--sizes", default="1000,100000", help="Comma-separated donor counts (e.g. 1000,100000,1000000)")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per request-level operation")
+    parser.add_argument("--io-iterations", type=int, default=3, help="Timed calls of save_data and load_data")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on (default: disabled)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results JSON to compare p50 latencies against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative p50 slowdown that fails the comparison (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(tempfile.mkdtemp(prefix="blood-donor-bench-"))
+
+    import logging
+    logging.disable(logging.INFO)
+    import official_mcp_server as server
+
+    if not args.cache:
+        server.response_cache.max_entries = 0
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "storage_backend": server.STORAGE_BACKEND,
+        "response_cache": args.cache,
+        "iterations": args.iterations,
+        "results": {},
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(f"== {size} donors ==")
+        results = asyncio.run(run_size(server, size, args.iterations, args.io_iterations))
+        report["results"][str(size)] = results
+        print(f"populated in {results['populate_seconds']}s")
+        print(f"{'operation':<24} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+        for operation, summary in results.items():
+            if isinstance(summary, dict):
+                print(f"{operation:<24} {summary['p50_ms']:>10.3f} {summary['p95_ms']:>10.3f} "
+                      f"{summary['p99_ms']:>10.3f} {summary['ops_per_sec']:>10}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{regressions} operations regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# Concurrent load generator for the /mcp endpoint, usable as a CI performance gate
+#
+# Usage: python -m benchmarks.load_test --profile smoke [--profiles benchmarks/workloads.json]
+#                                       [--url http://localhost:8080] [--concurrency 1,8,32]
+#                                       [--duration 10] [--output load.json]
+#
+# Without --url the app is driven in-process through the ASGI transport (in a temporary
+# directory, preloaded with synthetic donors). With --url a running server is driven over HTTP.
+# Exits non-zero when a profile threshold is exceeded.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.bench_suite import percentile
+
+DEFAULT_PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workloads.json")
+
+# The stall monitor wakes up this often; a wake-up later than the threshold counts as a stall
+STALL_PROBE_INTERVAL = 0.01
+STALL_THRESHOLD_MS = 50
+# Unmeasured requests sent before the first concurrency level
+WARMUP_REQUESTS = 50
+
+
+class StallMonitor:
+    """Measures event loop lag from inside the loop the in-process server runs on"""
+
+    def __init__(self, threshold_ms=STALL_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self._task = None
+        self._probe_started = None
+
+    def _record(self):
+        lag_ms = (time.perf_counter() - self._probe_started - STALL_PROBE_INTERVAL) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms > self.threshold_ms:
+            self.stalls += 1
+
+    async def _run(self):
+        while True:
+            self._probe_started = time.perf_counter()
+            await asyncio.sleep(STALL_PROBE_INTERVAL)
+            self._record()
+            self._probe_started = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # A stall right before the last workers finish leaves its probe pending; count it here
+        if self._probe_started is not None:
+            self._record()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def lag_histogram(metrics_text):
+    """{le: cumulative count} of the server's event loop lag histogram from /metrics"""
+    buckets = {}
+    for match in re.finditer(r'^blood_donor_event_loop_lag_seconds_bucket\{le="([^"]+)"\} (\d+)$', metrics_text, re.M):
+        buckets[float("inf") if match.group(1) == "+Inf" else float(match.group(1))] = int(match.group(2))
+    return buckets
+
+
+def remote_stalls(before, after, threshold_ms):
+    """(lag observations above the threshold, upper bound of the largest lag in ms) between two scrapes"""
+    delta = {bound: count - before.get(bound, 0) for bound, count in after.items()}
+    total = delta.get(float("inf"), 0)
+    if not total:
+        return 0, 0.0
+    within = max((count for bound, count in delta.items() if bound <= threshold_ms / 1000), default=0)
+    largest = min(bound for bound, count in delta.items() if count == total)
+    return total - within, largest * 1000
+
+
+class Workload:
+    """Builds random tools/call requests for a profile's operation mix"""
+
+    def __init__(self, mix, hospitals, blood_types, seed=7):
+        self.operations = list(mix)
+        self.weights = [mix[operation] for operation in self.operations]
+        self.hospitals = hospitals
+        self.blood_types = blood_types
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def next(self):
+        rng = self.rng
+        operation = rng.choices(self.operations, self.weights)[0]
+        city, hospital_name = rng.choice(self.hospitals)
+        self.counter += 1
+        if operation == "find_nearby_donors":
+            arguments = {"blood_type": rng.choice(self.blood_types), "city": city, "hospital_name": hospital_name,
+                         "radius_km": rng.choice((5, 10, 25)), "include_compatible": rng.random() < 0.5}
+        elif operation == "register_blood_donor":
+            arguments = {"name": f"Load {self.counter}", "blood_type": rng.choice(self.blood_types), "city": city,
+                         "hospital_name": hospital_name, "phone": f"7{self.counter:09d}"}
+        elif operation == "emergency_blood_request":
+            arguments = {"patient_name": f"Patient {self.counter}", "blood_type": rng.choice(self.blood_types),
+                         "city": city, "hospital_name": hospital_name, "donors_needed": rng.choice((1, 3, 5))}
+        elif operation == "list_donors":
+            arguments = rng.choice(({"limit": 10}, {"city": city, "limit": 10},
+                                    {"city": city, "blood_type": rng.choice(self.blood_types), "limit": 10}))
+        elif operation == "get_hospital_details":
+            arguments = {"city": city, "limit": 4}
+        else:
+            arguments = {}
+        return operation, arguments
+
+
+async def run_level(send, workload, concurrency, duration, monitor_threshold_ms, server=None):
+    """Drive `concurrency` workers for `duration` seconds; returns the level's results"""
+    samples = {}
+    errors = {}
+    deadline = time.perf_counter() + duration
+    monitor = StallMonitor(monitor_threshold_ms) if server is not None else None
+    if monitor is not None:
+        monitor.start()
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            operation, arguments = workload.next()
+            start = time.perf_counter()
+            try:
+                if operation == "save_data":
+                    if server is None:
+                        continue
+                    # Deliberately synchronous on the event loop, as a blocking call from a handler would be
+                    server.save_data()
+                    ok = True
+                else:
+                    ok = await send(operation, arguments)
+            except Exception:
+                ok = False
+            samples.setdefault(operation, []).append(time.perf_counter() - start)
+            if not ok:
+                errors[operation] = errors.get(operation, 0) + 1
+            # In-process requests that never wait on I/O don't yield; a real socket would
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if monitor is not None:
+        await monitor.stop()
+
+    every = sorted(latency for latencies in samples.values() for latency in latencies)
+    total = len(every)
+    error_count = sum(errors.values())
+    level = {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput": round(total / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "p50_ms": round(percentile(every, 0.50) * 1000, 3) if every else None,
+        "p95_ms": round(percentile(every, 0.95) * 1000, 3) if every else None,
+        "p99_ms": round(percentile(every, 0.99) * 1000, 3) if every else None,
+        "operations": {
+            operation: {
+                "requests": len(latencies),
+                "errors": errors.get(operation, 0),
+                "p50_ms": round(percentile(sorted(latencies), 0.50) * 1000, 3),
+                "p99_ms": round(percentile(sorted(latencies), 0.99) * 1000, 3),
+            }
+            for operation, latencies in sorted(samples.items())
+        },
+    }
+    if monitor is not None:
+        level["max_stall_ms"] = round(monitor.max_lag_ms, 3)
+        level["stalls"] = monitor.stalls
+    return level
+
+
+def check_thresholds(level, thresholds):
+    """Threshold violations of one concurrency level, as readable strings"""
+    failures = []
+    if "p99_ms" in thresholds and level["p99_ms"] is not None and level["p99_ms"] > thresholds["p99_ms"]:
+        failures.append(f"p99 {level['p99_ms']}ms > {thresholds['p99_ms']}ms")
+    if "error_rate" in thresholds and level["error_rate"] > thresholds["error_rate"]:
+        failures.append(f"error rate {level['error_rate']} > {thresholds['error_rate']}")
+    if "min_throughput" in thresholds and level["throughput"] < thresholds["min_throughput"]:
+        failures.append(f"throughput {level['throughput']}/s < {thresholds['min_throughput']}/s")
+    if "max_stall_ms" in thresholds and level.get("max_stall_ms") is not None \
+            and level["max_stall_ms"] > thresholds["max_stall_ms"]:
+        failures.append(f"event loop stall {level['max_stall_ms']}ms > {thresholds['max_stall_ms']}ms")
+    return failures
+
+
+async def run_profile(profile, concurrency_levels, duration, url=None, stall_threshold_ms=STALL_THRESHOLD_MS):
+    from httpx import ASGITransport, AsyncClient
+
+    from benchmarks.synthetic import BLOOD_TYPE_FREQUENCIES, generate_donors
+
+    server = None
+    if url is None:
+        import official_mcp_server as server
+        server.donor_store.load(generate_donors(profile.get("preload_donors", 0)))
+        server.requests = []
+        server.change_feed.reset()
+        if server.STORAGE_BACKEND != "sqlite":
+            server.writer.start()
+        client = AsyncClient(transport=ASGITransport(app=server.app), base_url="http://load-test", timeout=60)
+        hospitals_table = server.HOSPITALS
+    else:
+        from official_mcp_server import HOSPITALS as hospitals_table
+        client = AsyncClient(base_url=url, timeout=60)
+
+    hospitals = [(city, hospital["name"]) for city, entries in hospitals_table.items() for hospital in entries]
+    workload = Workload(profile["mix"], hospitals, list(BLOOD_TYPE_FREQUENCIES))
+    request_ids = iter(range(1, 1 << 62))
+
+    async def send(operation, arguments):
+        response = await client.post("/mcp", json={"jsonrpc": "2.0", "id": next(request_ids), "method": "tools/call",
+                                                   "params": {"name": operation, "arguments": arguments}})
+        if response.status_code != 200:
+            return False
+        body = response.json()
+        if "error" in body:
+            return False
+        text = body["result"]["content"][0]["text"]
+        return not text.startswith(("Error processing", "Unknown tool"))
+
+    levels = []
+    try:
+        # Warm-up: first calls pay for lazy imports, regex compilation and cold caches
+        for _ in range(profile.get("warmup_requests", WARMUP_REQUESTS)):
+            operation, arguments = workload.next()
+            if operation != "save_data":
+                await send(operation, arguments)
+
+        for concurrency in concurrency_levels:
+            before = lag_histogram((await client.get("/metrics")).text) if url else None
+            level = await run_level(send, workload, concurrency, duration, stall_threshold_ms, server)
+            if url:
+                after = lag_histogram((await client.get("/metrics")).text)
+                if after:
+                    level["stalls"], level["max_stall_ms"] = remote_stalls(before, after, stall_threshold_ms)
+            levels.append(level)
+    finally:
+        await client.aclose()
+        if server is not None and server.STORAGE_BACKEND != "sqlite":
+            server.writer.close()
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /mcp with a concurrent tools/call workload")
+    parser.add_argument("--profile", default="smoke", help="Workload profile name")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILES, help="Workload profiles JSON file")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process ASGI)")
+    parser.add_argument("--concurrency", help="Comma-separated concurrency levels (overrides the profile)")
+    parser.add_argument("--duration", type=float, help="Seconds per concurrency level (overrides the profile)")
+    parser.add_argument("--stall-threshold-ms", type=float, default=STALL_THRESHOLD_MS,
+                        help="Event loop lag counted as a stall")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--no-gate", action="store_true", help="Report threshold violations without failing")
+    args = parser.parse_args()
+
+    with open(args.profiles, "r", encoding="utf-8") as f:
+        profiles = json.load(f)
+    if args.profile not in profiles:
+        parser.error(f"Unknown profile {args.profile}; available: {', '.join(profiles)}")
+    profile = profiles[args.profile]
+    concurrency_levels = ([int(value) for value in args.concurrency.split(",")] if args.concurrency
+                          else profile.get("concurrency", [1]))
+    duration = args.duration if args.duration is not None else profile.get("duration_seconds", 10)
+
+    output = os.path.abspath(args.output) if args.output else None
+    if args.url is None:
+        os.chdir(tempfile.mkdtemp(prefix="blood-donor-load-"))
+    import logging
+    logging.disable(logging.INFO)
+
+    levels = asyncio.run(run_profile(profile, concurrency_levels, duration, args.url, args.stall_threshold_ms))
+
+    thresholds = profile.get("thresholds", {})
+    failures = []
+    print(f"Profile {args.profile}: {profile.get('description', '')}")
+    print(f"{'conc':>5} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'stall ms':>9}")
+    for level in levels:
+        print(f"{level['concurrency']:>5} {level['requests']:>9} {level['throughput']:>9} {level['p50_ms']:>9} "
+              f"{level['p95_ms']:>9} {level['p99_ms']:>9} {level['error_rate']:>7.2%} {level.get('max_stall_ms', '-'):>9}")
+        for failure in check_thresholds(level, thresholds):
+            failures.append(f"concurrency {level['concurrency']}: {failure}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "profile": args.profile, "target": args.url or "asgi",
+                       "duration_seconds": duration, "thresholds": thresholds, "levels": levels,
+                       "failures": failures}, f, indent=2)
+        print(f"Results written to {output}")
+
+    if failures:
+        print("Thresholds exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        if not args.no_gate:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
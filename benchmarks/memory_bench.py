@@ -0,0 +1,58 @@
+# Memory per donor: one dict per donor vs. the column-wise DonorStore
+#
+# Usage: python -m benchmarks.memory_bench [--sizes 10000,100000,1000000]
+
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.synthetic import generate_donors
+from donor_store import DonorStore
+
+
+def measure(build):
+    """Bytes still allocated after build() returns, with the result kept alive"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def build_dicts(size):
+    donors = []
+    for donor_id, donor in enumerate(generate_donors(size), 1):
+        donor["id"] = donor_id
+        donors.append(donor)
+    return donors
+
+
+def build_store(size):
+    store = DonorStore()
+    for donor in generate_donors(size):
+        store.add(donor)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory per donor: one dict per donor vs. the column-wise DonorStore")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated donor counts to measure")
+    args = parser.parse_args()
+
+    print(f"{'donors':>10}  {'list of dicts':>16}  {'DonorStore':>16}  {'saving':>7}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        dict_bytes = measure(lambda: build_dicts(size))
+        store_bytes = measure(lambda: build_store(size))
+        print(f"{size:>10}  {dict_bytes / size:>10.0f} B/donor  {store_bytes / size:>10.0f} B/donor  "
+              f"{1 - store_bytes / dict_bytes:>6.0%}")
+    print("(DonorStore figures include its blood type, city, hospital, phone and spatial indexes; "
+          "the list of dicts has no indexes at all)")
+
+
+if __name__ == "__main__":
+    main()
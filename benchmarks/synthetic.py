@@ -0,0 +1,41 @@
+# Synthetic donor datasets scattered around the hospitals in HOSPITALS
+
+import random
+
+from official_mcp_server import HOSPITALS
+
+# Approximate ABO/Rh distribution of the Indian population (percent)
+BLOOD_TYPE_FREQUENCIES = {
+    "O+": 37.1, "B+": 32.1, "A+": 22.1, "AB+": 6.4,
+    "O-": 0.8, "B-": 0.7, "A-": 0.5, "AB-": 0.3,
+}
+
+# Donors live within roughly this many degrees (~5 km) of the hospital they registered at
+SPREAD_DEG = 0.05
+
+
+def generate_donors(count, seed=42, scatter=True):
+    """Yield `count` donor dicts with realistic blood types around real hospital coordinates.
+
+    With ``scatter=False`` donors sit exactly on their hospital's coordinates,
+    as donors registered through register_blood_donor do.
+    """
+    rng = random.Random(seed)
+    hospitals = [(city, hospital) for city, entries in HOSPITALS.items() for hospital in entries]
+    blood_types = list(BLOOD_TYPE_FREQUENCIES)
+    weights = list(BLOOD_TYPE_FREQUENCIES.values())
+    for i in range(count):
+        city, hospital = rng.choice(hospitals)
+        lat, lng = hospital["lat"], hospital["lng"]
+        if scatter:
+            lat += rng.gauss(0, SPREAD_DEG)
+            lng += rng.gauss(0, SPREAD_DEG)
+        yield {
+            "name": f"Donor {i}",
+            "blood_type": rng.choices(blood_types, weights)[0],
+            "city": city,
+            "hospital": hospital["name"],
+            "phone": f"9{i:09d}",
+            "latitude": lat,
+            "longitude": lng
+        }
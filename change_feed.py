@@ -0,0 +1,94 @@
+# In-process feed of donor and request changes with sequence numbers and replay
+
+import logging
+from bisect import bisect_right
+from collections import deque, namedtuple
+from itertools import islice
+from operator import attrgetter
+
+logger = logging.getLogger("blood-donor-india")
+
+# kind: "donor" or "request" (None for "reset"); op: "insert", "update", "delete" or "reset"
+Change = namedtuple("Change", ["seq", "kind", "op", "record"])
+
+
+class ChangeFeedGap(LookupError):
+    """The requested changes are older than the feed retains; the subscriber has to rebuild"""
+
+
+class ChangeFeed:
+    """Publishes every mutation as a Change with a monotonically increasing ``seq``.
+
+    Subscribers are named callbacks, called synchronously in publish order,
+    so derived state (caches, counters, indexes) can be updated one change
+    at a time instead of rebuilt. The last ``retain`` changes are kept.
+    ``subscribe(..., after_seq=n)`` first replays everything after ``n``, so
+    a subscriber restarted with the seq it last saw catches up without a
+    rebuild. A "reset" change means all previous state was replaced.
+
+    Seqs only increase, but ``reset(base_seq)`` can skip ahead, so the
+    retained log isn't necessarily contiguous.
+    """
+
+    def __init__(self, retain=10000):
+        self.seq = 0
+        self._log = deque(maxlen=retain)
+        # Seq of the newest change pushed out of the log; anything after it is still retained
+        self._dropped_seq = 0
+        self._subscribers = {}
+        self._positions = {}
+
+    def publish(self, kind, op, record):
+        """Record a change and deliver it to every subscriber; returns the Change"""
+        self.seq += 1
+        change = Change(self.seq, kind, op, record)
+        if len(self._log) == self._log.maxlen:
+            self._dropped_seq = self._log[0].seq
+        self._log.append(change)
+        for name, callback in list(self._subscribers.items()):
+            self._deliver(name, callback, change)
+        return change
+
+    def reset(self, base_seq=0):
+        """Publish a "reset" numbered after `base_seq` as well, e.g. the persisted journal position"""
+        self.seq = max(self.seq, base_seq)
+        return self.publish(None, "reset", None)
+
+    def _deliver(self, name, callback, change):
+        try:
+            callback(change)
+        except Exception as e:
+            logger.error(f"Change feed subscriber {name} failed on change {change.seq}: {e}")
+        self._positions[name] = change.seq
+
+    def since(self, after_seq, limit=None):
+        """Retained changes with a seq above `after_seq`; raises ChangeFeedGap if some were dropped"""
+        if after_seq < self._dropped_seq:
+            raise ChangeFeedGap(f"changes after {after_seq} are no longer retained (oldest is {self._log[0].seq})")
+        start = bisect_right(self._log, after_seq, key=attrgetter("seq"))
+        stop = len(self._log) if limit is None else min(len(self._log), start + limit)
+        return list(islice(self._log, start, stop))
+
+    def subscribe(self, name, callback, after_seq=None):
+        """Register `callback`, replaying retained changes after `after_seq` first if given.
+
+        Raises ChangeFeedGap, without subscribing, when `after_seq` is too old to replay.
+        """
+        backlog = self.since(after_seq) if after_seq is not None else []
+        self._positions[name] = self.seq if after_seq is None else after_seq
+        for change in backlog:
+            self._deliver(name, callback, change)
+        self._subscribers[name] = callback
+
+    def unsubscribe(self, name):
+        """Remove a subscriber; returns the seq it had seen, to resume from later"""
+        self._subscribers.pop(name, None)
+        return self._positions.pop(name, None)
+
+    def stats(self):
+        return {
+            "seq": self.seq,
+            "retained": len(self._log),
+            "oldest_seq": self._log[0].seq if self._log else None,
+            "subscribers": {name: self._positions.get(name) for name in self._subscribers},
+        }
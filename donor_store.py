@@ -0,0 +1,273 @@
+# In-memory donor store with secondary indexes
+
+from array import array
+from bisect import bisect_left
+
+from spatial_index import DonorGridIndex
+
+# Fields held in dedicated columns; anything else a record carries is kept aside per donor
+DONOR_FIELDS = ("id", "name", "blood_type", "city", "hospital", "phone", "latitude", "longitude")
+
+
+class InternTable:
+    """Maps repeated strings (blood types, cities, hospitals) to small integer codes"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self._codes.get(value)
+
+
+class DonorRecords:
+    """Read-only sequence of dict views over a DonorStore, in registration order"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._store.view(position) for position in range(*key.indices(len(self._store)))]
+        if key < 0:
+            key += len(self._store)
+        if not 0 <= key < len(self._store):
+            raise IndexError("donor position out of range")
+        return self._store.view(key)
+
+    def __iter__(self):
+        return (self._store.view(position) for position in range(len(self._store)))
+
+
+class DonorStore:
+    """Owns the donor records and keeps their indexes in step with them.
+
+    Records are stored column-wise rather than as one dict per donor. Names
+    and phones are plain string lists. Blood type, city and hospital are
+    interned to integer codes in compact arrays. Ids are a 64-bit array, and
+    the coordinates live in the spatial index's float64 arrays. ``view()``
+    builds a donor dict on demand, so dicts only exist at the
+    response-formatting boundary.
+
+    Each donor gets a unique integer ``id`` on insert. Secondary indexes map
+    blood type, city, hospital and phone to arrays of record positions, so
+    lookups cost O(1) to find the bucket and O(k) to return its k donors.
+    Radius searches go through the DonorGridIndex.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._ids = array("q")
+        self._names = []
+        self._phones = []
+        self._blood_type_codes = array("B")
+        self._city_codes = array("H")
+        self._hospital_codes = array("I")
+        self._blood_types = InternTable()
+        self._cities = InternTable()
+        self._hospitals = InternTable()
+        # Ids that don't follow the dense id == position + 1 numbering
+        self._sparse_ids = {}
+        self._extras = {}
+        self._by_blood_type = {}
+        self._by_city = {}
+        self._by_hospital = {}
+        self._by_phone = {}
+        self.spatial = DonorGridIndex()
+        self._next_id = 1
+
+    def load(self, donors):
+        """Replace the contents with previously persisted donors"""
+        self.clear()
+        for position, donor in enumerate(donors, 1):
+            # Records written before donor IDs existed get their 1-based list position
+            self._index(donor.get("id", position), donor)
+
+    def add(self, donor):
+        """Insert a new donor, assigning its id; returns a view of the stored record"""
+        position = self._index(self._next_id, donor)
+        return self.view(position)
+
+    def add_many(self, donors):
+        """Insert new donors in order; returns views of the stored records"""
+        return [self.add(donor) for donor in donors]
+
+    def add_donation(self, donor_id, donated_on):
+        """Add an ISO donation date to a donor's history; returns (donor, False if it was already there).
+
+        Raises KeyError for an unknown id.
+        """
+        position = self._position_of(donor_id)
+        if position is None:
+            raise KeyError(donor_id)
+        extra = self._extras.setdefault(position, {})
+        donations = extra.get("donations", [])
+        if donated_on in donations:
+            return self.view(position), False
+        extra["donations"] = sorted(donations + [donated_on])
+        return self.view(position), True
+
+    def _index(self, donor_id, donor):
+        if self._position_of(donor_id) is not None:
+            raise ValueError(f"Duplicate donor id {donor_id}")
+        position = len(self._ids)
+        blood_type_code = self._blood_types.code(donor["blood_type"])
+        city_code = self._cities.code(donor["city"])
+        hospital_code = self._hospitals.code(donor["hospital"])
+
+        self._ids.append(donor_id)
+        if donor_id != position + 1:
+            self._sparse_ids[donor_id] = position
+        self._names.append(donor["name"])
+        self._phones.append(donor["phone"])
+        self._blood_type_codes.append(blood_type_code)
+        self._city_codes.append(city_code)
+        self._hospital_codes.append(hospital_code)
+        extras = {key: value for key, value in donor.items() if key not in DONOR_FIELDS}
+        if extras:
+            self._extras[position] = extras
+
+        self._by_blood_type.setdefault(blood_type_code, array("I")).append(position)
+        self._by_city.setdefault(city_code, array("I")).append(position)
+        self._by_hospital.setdefault(hospital_code, array("I")).append(position)
+        self._index_phone(donor["phone"], position)
+        self.spatial.add(position, donor["blood_type"], donor["latitude"], donor["longitude"])
+        self._next_id = max(self._next_id, donor_id + 1)
+        return position
+
+    def _index_phone(self, phone, position):
+        # Phones are nearly unique, so a bare position avoids an array per donor
+        existing = self._by_phone.get(phone)
+        if existing is None:
+            self._by_phone[phone] = position
+        elif isinstance(existing, int):
+            self._by_phone[phone] = array("I", (existing, position))
+        else:
+            existing.append(position)
+
+    def _position_of(self, donor_id):
+        position = donor_id - 1
+        if 0 <= position < len(self._ids) and self._ids[position] == donor_id:
+            return position
+        return self._sparse_ids.get(donor_id)
+
+    def view(self, position):
+        """Build the dict form of the donor at `position`"""
+        latitude, longitude = self.spatial.coordinates(position)
+        donor = {
+            "id": self._ids[position],
+            "name": self._names[position],
+            "blood_type": self._blood_types.values[self._blood_type_codes[position]],
+            "city": self._cities.values[self._city_codes[position]],
+            "hospital": self._hospitals.values[self._hospital_codes[position]],
+            "phone": self._phones[position],
+            "latitude": latitude,
+            "longitude": longitude
+        }
+        extras = self._extras.get(position)
+        if extras:
+            donor.update(extras)
+        return donor
+
+    @property
+    def records(self):
+        """Sequence of dict views of every donor in registration order"""
+        return DonorRecords(self)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, donor_id):
+        position = self._position_of(donor_id)
+        return None if position is None else self.view(position)
+
+    def _lookup(self, index, key):
+        return [self.view(position) for position in index.get(key, ())]
+
+    def by_blood_type(self, blood_type):
+        return self._lookup(self._by_blood_type, self._blood_types.lookup(blood_type))
+
+    def by_city(self, city):
+        return self._lookup(self._by_city, self._cities.lookup(city))
+
+    def by_hospital(self, hospital_name):
+        return self._lookup(self._by_hospital, self._hospitals.lookup(hospital_name))
+
+    def by_phone(self, phone):
+        positions = self._by_phone.get(phone, ())
+        if isinstance(positions, int):
+            positions = (positions,)
+        return [self.view(position) for position in positions]
+
+    def with_field(self, name):
+        """Donors whose record carries the non-indexed field `name`"""
+        return [self.view(position) for position, extras in self._extras.items() if name in extras]
+
+    def page(self, start_index, limit):
+        """Donors in registration order, as a slice"""
+        return self.records[start_index:start_index + limit]
+
+    def scan(self, after_id=None, limit=100, blood_type=None, city=None, hospital=None):
+        """Up to `limit` donors registered after donor `after_id`, in registration order, optionally filtered.
+
+        The smallest index bucket among the filters drives the scan; the
+        other filters are checked against the coded columns. Raises KeyError
+        for an unknown `after_id`.
+        """
+        start = 0
+        if after_id is not None:
+            position = self._position_of(after_id)
+            if position is None:
+                raise KeyError(after_id)
+            start = position + 1
+
+        filters = []
+        for value, table, index, codes in ((blood_type, self._blood_types, self._by_blood_type, self._blood_type_codes),
+                                           (city, self._cities, self._by_city, self._city_codes),
+                                           (hospital, self._hospitals, self._by_hospital, self._hospital_codes)):
+            if value is None:
+                continue
+            code = table.lookup(value)
+            if code is None:
+                return []
+            filters.append((index.get(code, ()), codes, code))
+        if not filters:
+            return self.records[start:start + limit]
+
+        filters.sort(key=lambda item: len(item[0]))
+        positions, others = filters[0][0], filters[1:]
+        donors = []
+        # Index buckets hold positions in ascending order
+        for position in positions[bisect_left(positions, start):]:
+            if all(codes[position] == code for _, codes, code in others):
+                donors.append(self.view(position))
+                if len(donors) >= limit:
+                    break
+        return donors
+
+    def nearest(self, blood_types, lat, lng, radius_km, limit, exclude=None):
+        """Radius search; returns (total_matches, [(distance_km, donor), ...]) for up to `limit` winners.
+
+        Donors whose id is in `exclude` are left out before counting and ranking.
+        """
+        skip = None
+        if exclude:
+            ids = self._ids
+            skip = lambda position: ids[position] in exclude
+        total, winners = self.spatial.nearest(blood_types, lat, lng, radius_km, limit, skip)
+        return total, [(distance, self.view(position)) for distance, position in winners]
@@ -0,0 +1,72 @@
+# Donation eligibility: which donors gave blood too recently to be asked again
+
+import heapq
+import time
+from datetime import date, datetime, timedelta
+
+
+def parse_donation_date(value):
+    """Parse a YYYY-MM-DD donation date; raises ValueError"""
+    return date.fromisoformat(value)
+
+
+class EligibilityIndex:
+    """Donors who can't donate yet, keyed by donor id, with a min-heap of when each becomes eligible.
+
+    A donor's donation history is the ``donations`` list of ISO dates on the
+    record; they are ineligible until ``interval_days`` after the latest one.
+    ``ineligible`` maps donor id to that timestamp, so a search checks one
+    candidate in O(1). ``release_due()`` pops every donor whose time has
+    come off the heap. A donor who donates again just gets a newer heap
+    entry; the stale one is skipped when it surfaces.
+    """
+
+    def __init__(self, interval_days=90):
+        self.interval = timedelta(days=interval_days)
+        self.ineligible = {}
+        self._heap = []
+
+    def clear(self):
+        self.ineligible = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.ineligible)
+
+    def next_eligible(self, donor):
+        """Date from which `donor` may donate again, or None if they never donated"""
+        donations = donor.get("donations")
+        if not donations:
+            return None
+        return parse_donation_date(max(donations)) + self.interval
+
+    def track(self, donor, now=None):
+        """Bring one donor's entry in line with their donation history"""
+        eligible_on = self.next_eligible(donor)
+        if eligible_on is None:
+            self.ineligible.pop(donor["id"], None)
+            return
+        eligible_at = datetime.combine(eligible_on, datetime.min.time()).timestamp()
+        if eligible_at <= (time.time() if now is None else now):
+            self.ineligible.pop(donor["id"], None)
+        elif self.ineligible.get(donor["id"]) != eligible_at:
+            self.ineligible[donor["id"]] = eligible_at
+            heapq.heappush(self._heap, (eligible_at, donor["id"]))
+
+    def load(self, donors, now=None):
+        """Rebuild from every donor that has a donation history"""
+        self.clear()
+        for donor in donors:
+            self.track(donor, now)
+
+    def release_due(self, now=None):
+        """Mark donors whose waiting period is over as eligible; returns their ids"""
+        now = time.time() if now is None else now
+        heap = self._heap
+        released = []
+        while heap and heap[0][0] <= now:
+            eligible_at, donor_id = heapq.heappop(heap)
+            if self.ineligible.get(donor_id) == eligible_at:
+                del self.ineligible[donor_id]
+                released.append(donor_id)
+        return released
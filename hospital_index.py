@@ -0,0 +1,234 @@
+# Precomputed lookup index over the hospital table, with fuzzy fallback matching
+
+import functools
+import math
+import re
+
+# Substrings up to this length are posted directly; longer queries intersect their trigrams
+MAX_GRAM = 3
+# Fuzzy matching: a query token must be at least this similar to a name token to count
+MIN_TOKEN_SIMILARITY = 0.6
+# A hospital needs this overall score to be suggested at all
+FUZZY_MIN_SCORE = 0.6
+# Candidates scoring within this margin of the best one are reported together as ambiguous
+FUZZY_MARGIN = 0.15
+
+
+def normalise(name):
+    return name.lower()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two short strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def token_similarity(query_token, token):
+    """1.0 for an exact token, 0.9 for an abbreviation ("hosp"), else 1 - normalised edit distance"""
+    if query_token == token:
+        return 1.0
+    if len(query_token) >= 3 and token.startswith(query_token):
+        return 0.9
+    return 1 - edit_distance(query_token, token) / max(len(query_token), len(token))
+
+
+class HospitalIndex:
+    """Lookup structures built once over a {city: [hospital, ...]} table.
+
+    Hospitals are numbered in table order (city by city), and every lookup
+    returns matches in that order, so results are the same as scanning the
+    table. The index holds:
+
+    - the normalised (lowercased) name of every hospital and its city,
+    - an exact-name map to every hospital whose name contains that name,
+    - postings for every 1-, 2- and 3-character substring of every name.
+
+    A query of up to three characters is answered straight from its postings.
+    A longer query intersects the postings of its trigrams and checks only the
+    surviving names.
+
+    When no name contains the query, a fuzzy matcher scores hospitals on
+    their name and city tokens ("apolo", "AIIMS delhi hosp", "kem pune").
+    Trigrams of each padded token point back to the token vocabulary, so only
+    tokens that share a trigram with a query token are compared. Rare tokens
+    weigh more than common ones like "hospital". Resolved queries are kept
+    in an LRU cache keyed on the index version.
+
+    The index fingerprints the table on each lookup (one entry per city) and
+    rebuilds itself when a city or hospital list is added, replaced or
+    resized. In-place edits of a hospital's name need an explicit
+    ``invalidate()``.
+    """
+
+    def __init__(self, hospitals, cache_size=1024):
+        self._hospitals = hospitals
+        self._fingerprint = None
+        self.version = 0
+        self._resolve = functools.lru_cache(maxsize=cache_size)(self._resolve_uncached)
+
+    def _current_fingerprint(self):
+        return tuple((city, id(entries), len(entries)) for city, entries in self._hospitals.items())
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        self._fingerprint = None
+
+    def _ensure_fresh(self):
+        fingerprint = self._current_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._build()
+            self._fingerprint = fingerprint
+            self.version += 1
+
+    def _build(self):
+        self._entries = []
+        self._names = []
+        self._grams = {}
+        for city, hospitals in self._hospitals.items():
+            for hospital in hospitals:
+                ordinal = len(self._entries)
+                name = normalise(hospital["name"])
+                self._entries.append((hospital, city))
+                self._names.append(name)
+                for n in range(1, MAX_GRAM + 1):
+                    for gram in ngrams(name, n):
+                        self._grams.setdefault(gram, []).append(ordinal)
+
+        self._exact = {}
+        for name in self._names:
+            if name not in self._exact:
+                self._exact[name] = self._substring_matches(name)
+
+        # Fuzzy matching: token -> hospitals, padded-token trigram -> tokens, token rarity
+        self._token_postings = {}
+        for ordinal, (hospital, city) in enumerate(self._entries):
+            for token in set(tokenize(hospital["name"])) | set(tokenize(city)):
+                self._token_postings.setdefault(token, []).append(ordinal)
+        self._token_grams = {}
+        for token in self._token_postings:
+            for gram in ngrams(f" {token} ", 3):
+                self._token_grams.setdefault(gram, set()).add(token)
+        total = len(self._entries)
+        self._idf = {token: math.log(1 + total / len(postings)) for token, postings in self._token_postings.items()}
+        self._max_idf = max(self._idf.values(), default=1.0)
+
+    def _substring_matches(self, query):
+        """Ordinals of every hospital whose normalised name contains `query`, in table order"""
+        if not query:
+            return list(range(len(self._entries)))
+        if len(query) <= MAX_GRAM:
+            return self._grams.get(query, [])
+
+        postings = []
+        for gram in ngrams(query, MAX_GRAM):
+            posting = self._grams.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [ordinal for ordinal in sorted(candidates) if query in self._names[ordinal]]
+
+    def matches(self, hospital_name):
+        """(hospital, city) pairs for every hospital whose name contains `hospital_name`"""
+        self._ensure_fresh()
+        query = normalise(hospital_name)
+        ordinals = self._exact.get(query)
+        if ordinals is None:
+            ordinals = self._substring_matches(query)
+        return [self._entries[ordinal] for ordinal in ordinals]
+
+    def _fuzzy_matches(self, hospital_name):
+        """(score, ordinal) for every hospital scoring at least FUZZY_MIN_SCORE, best first"""
+        self._ensure_fresh()
+        query_tokens = tokenize(hospital_name)
+        if not query_tokens:
+            return []
+
+        scores = {}
+        total_weight = 0.0
+        for query_token in query_tokens:
+            similar = {}
+            for gram in ngrams(f" {query_token} ", 3):
+                for token in self._token_grams.get(gram, ()):
+                    if token not in similar:
+                        similar[token] = token_similarity(query_token, token)
+            similar = {token: sim for token, sim in similar.items() if sim >= MIN_TOKEN_SIMILARITY}
+            if not similar:
+                # Unknown words still count against every candidate
+                total_weight += self._max_idf
+                continue
+
+            # Weigh the query token by the rarity of what it most resembles
+            best_token = max(similar, key=lambda token: (similar[token], self._idf[token]))
+            weight = self._idf[best_token]
+            total_weight += weight
+            contributions = {}
+            for token, sim in similar.items():
+                for ordinal in self._token_postings[token]:
+                    if sim > contributions.get(ordinal, 0.0):
+                        contributions[ordinal] = sim
+            for ordinal, sim in contributions.items():
+                scores[ordinal] = scores.get(ordinal, 0.0) + weight * sim
+
+        ranked = [(score / total_weight, ordinal) for ordinal, score in scores.items()
+                  if score / total_weight >= FUZZY_MIN_SCORE]
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return ranked
+
+    def find(self, hospital_name, city=None):
+        """Resolve a hospital name, preferring the given city.
+
+        Returns (None, None) when nothing matches, (hospital, city) for a single
+        match and ("multiple", [(hospital, city), ...]) when disambiguation is
+        needed. Names containing the query win; otherwise the best fuzzy
+        matches are used, and several close scores are reported best first.
+        """
+        self._ensure_fresh()
+        return self._resolve(normalise(hospital_name), city.lower() if city else None, self.version)
+
+    def _resolve_uncached(self, query, city, version):
+        all_matches = self.matches(query)
+        matches = [match for match in all_matches if match[1] == city] if city else []
+        # If no matches found in the specified city, or if no city was provided, search all cities
+        if not matches:
+            matches = [match for match in all_matches if match[1] != city]
+
+        if not matches:
+            ranked = self._fuzzy_matches(query)
+            pool = [item for item in ranked if self._entries[item[1]][1] == city] if city else []
+            if not pool:
+                pool = [item for item in ranked if self._entries[item[1]][1] != city]
+            if pool:
+                best = pool[0][0]
+                matches = [self._entries[ordinal] for score, ordinal in pool if best - score < FUZZY_MARGIN]
+
+        if not matches:
+            return None, None
+        elif len(matches) == 1:
+            return matches[0]
+        else:
+            return "multiple", matches
+
+    def cache_info(self):
+        return self._resolve.cache_info()
@@ -0,0 +1,309 @@
+# Asynchronous donor notifications: channel adapters and a rate-limited, retrying dispatcher
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+
+import httpx
+
+logger = logging.getLogger("blood-donor-india")
+
+# Lower is sent first
+URGENCY_PRIORITY = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+
+class NotificationError(Exception):
+    """A channel failed to deliver a message; ``retry`` says whether trying again can help"""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class StubAdapter:
+    """Delivers nothing: logs each message and keeps the last ``keep`` of them in ``sent``, for local testing"""
+
+    name = "stub"
+
+    def __init__(self, keep=1000):
+        self.sent = deque(maxlen=keep)
+
+    async def send(self, phone, message):
+        self.sent.append((phone, message))
+        logger.info(f"[stub notification] to {phone}: {message.splitlines()[0]}")
+
+
+class WebhookAdapter:
+    """POSTs each notification as JSON to ``url``; any 2xx response counts as delivered"""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=10.0, headers=None):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout, headers=headers)
+
+    async def _post(self, **kwargs):
+        try:
+            response = await self._client.post(self.url, **kwargs)
+        except httpx.HTTPError as e:
+            raise NotificationError(f"{self.name}: {e}")
+        if response.status_code >= 400:
+            # Client errors other than throttling won't succeed on a retry
+            retry = response.status_code == 429 or response.status_code >= 500
+            raise NotificationError(f"{self.name}: HTTP {response.status_code} {response.text[:200]}", retry=retry)
+        return response
+
+    async def send(self, phone, message):
+        await self._post(json={"phone": phone, "message": message})
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class TwilioSmsAdapter(WebhookAdapter):
+    """Sends SMS through the Twilio Messages API"""
+
+    name = "sms"
+    address_prefix = ""
+
+    def __init__(self, account_sid, auth_token, sender, timeout=10.0):
+        super().__init__(f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json", timeout)
+        self._auth = (account_sid, auth_token)
+        self.sender = sender
+
+    def _address(self, phone):
+        # Donor phones are stored as typed; Twilio wants E.164
+        digits = "".join(ch for ch in phone if ch.isdigit())
+        if len(digits) == 10:
+            digits = "91" + digits
+        return f"{self.address_prefix}+{digits}"
+
+    async def send(self, phone, message):
+        await self._post(auth=self._auth, data={"From": f"{self.address_prefix}{self.sender}",
+                                                "To": self._address(phone), "Body": message})
+
+
+class TwilioWhatsAppAdapter(TwilioSmsAdapter):
+    """Sends WhatsApp messages through the Twilio Messages API"""
+
+    name = "whatsapp"
+    address_prefix = "whatsapp:"
+
+
+class RateLimiter:
+    """At most ``limit`` events per key in any ``window`` seconds (sliding window)"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._events = {}
+
+    def wait_time(self, key, now=None):
+        """Seconds until `key` may have another event (0 if it may now)"""
+        now = time.monotonic() if now is None else now
+        events = self._events.get(key)
+        if not events:
+            return 0.0
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return 0.0
+        if len(events) < self.limit:
+            return 0.0
+        return events[0] + self.window - now
+
+    def record(self, key, now=None):
+        self._events.setdefault(key, deque()).append(time.monotonic() if now is None else now)
+
+
+class NotificationDispatcher:
+    """Sends donor notifications from asyncio worker tasks, most urgent request first.
+
+    ``enqueue()`` never blocks or awaits: it puts one job per donor on a
+    bounded priority queue (ordered by urgency, then arrival) and returns. A
+    donor already notified, or queued, for the same request id within
+    ``dedup_ttl`` seconds is skipped.
+
+    Each job tries the ``adapters`` in order until one delivers. A retryable
+    failure is put back on the queue after an exponential backoff with jitter
+    (``retry_base`` * 2^attempt seconds), up to ``max_attempts`` per channel.
+    After that, the next channel gets its turn. Each donor may be notified
+    ``donor_limit`` times per ``donor_window`` seconds; further jobs for them
+    are dropped. Each channel sends at most ``channel_rate`` messages per
+    second; workers wait for a free slot instead of dropping.
+
+    ``observer``, if given, is called as ``observer(channel, outcome)`` for
+    every outcome: "sent", "retry", "failed", "duplicate", "rate_limited" or
+    "dropped". The channel is None when no channel was involved.
+    """
+
+    def __init__(self, adapters, workers=4, max_queue=10000, max_attempts=4, retry_base=1.0,
+                 donor_limit=3, donor_window=3600.0, channel_rate=10.0, dedup_ttl=86400.0, observer=None):
+        if not channel_rate > 0:
+            raise ValueError(f"channel_rate must be above 0, got {channel_rate}")
+        self.adapters = list(adapters)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.dedup_ttl = dedup_ttl
+        self.observer = observer
+        self.queue = None
+        self._max_queue = max_queue
+        self._tasks = []
+        self._retry_handles = set()
+        self._order = itertools.count()
+        self._seen = OrderedDict()
+        self._donor_limiter = RateLimiter(donor_limit, donor_window)
+        self._channel_limiter = RateLimiter(max(1, int(channel_rate)), max(1, int(channel_rate)) / channel_rate)
+
+    @property
+    def running(self):
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self.running:
+            return
+        if self.queue is None or self._tasks:
+            # First start, or the loop the previous workers ran on has gone away
+            self.queue = asyncio.PriorityQueue(maxsize=self._max_queue)
+            self._retry_handles = set()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"notifier-{i}") for i in range(self.workers)]
+
+    async def stop(self, drain_timeout=5.0):
+        """Give queued notifications up to `drain_timeout` seconds, then stop the workers and adapters"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping the notifier with {self.queue.qsize()} notifications still queued")
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for adapter in self.adapters:
+            close = getattr(adapter, "close", None)
+            if close is not None:
+                await close()
+
+    def _observe(self, channel, outcome):
+        if self.observer is not None:
+            try:
+                self.observer(channel, outcome)
+            except Exception as e:
+                logger.error(f"Notification observer failed: {e}")
+
+    def _first_time(self, key):
+        """True, and remembers `key`, unless it was seen within dedup_ttl"""
+        now = time.monotonic()
+        seen = self._seen
+        while seen:
+            oldest_key, seen_at = next(iter(seen.items()))
+            if seen_at > now - self.dedup_ttl:
+                break
+            del seen[oldest_key]
+        if key in seen:
+            return False
+        seen[key] = now
+        return True
+
+    def enqueue(self, request_id, donors, message, urgency="high"):
+        """Queue `message` for every donor (dicts with id and phone); returns how many were queued"""
+        if not self.adapters:
+            return 0
+        self.start()
+        priority = URGENCY_PRIORITY.get(str(urgency).lower(), URGENCY_PRIORITY["high"])
+        queued = 0
+        for donor in donors:
+            if not self._first_time((request_id, donor["id"])):
+                self._observe(None, "duplicate")
+                continue
+            job = {"request": request_id, "donor_id": donor["id"], "phone": donor["phone"],
+                   "message": message, "channel": 0, "attempt": 0}
+            try:
+                self.queue.put_nowait((priority, next(self._order), job))
+            except asyncio.QueueFull:
+                self._seen.pop((request_id, donor["id"]), None)
+                logger.warning(f"Notification queue full; dropping notification for donor {donor['id']}")
+                self._observe(None, "dropped")
+                continue
+            queued += 1
+        return queued
+
+    def _requeue(self, handle, item):
+        self._retry_handles.discard(handle)
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning(f"Notification queue full; dropping retry for donor {item[2]['donor_id']}")
+            self._observe(self.adapters[item[2]["channel"]].name, "dropped")
+
+    def _retry_later(self, priority, job, delay):
+        loop = asyncio.get_running_loop()
+        handle = None
+
+        def fire():
+            self._requeue(handle, (priority, next(self._order), job))
+        handle = loop.call_later(delay, fire)
+        self._retry_handles.add(handle)
+
+    async def _worker(self):
+        while True:
+            priority, _, job = await self.queue.get()
+            try:
+                await self._deliver(priority, job)
+            except Exception as e:
+                logger.error(f"Notification worker failed on donor {job['donor_id']}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, priority, job):
+        adapter = self.adapters[job["channel"]]
+        if job["attempt"] == 0 and job["channel"] == 0:
+            if self._donor_limiter.wait_time(job["donor_id"]) > 0:
+                self._observe(None, "rate_limited")
+                return
+            self._donor_limiter.record(job["donor_id"])
+
+        while True:
+            delay = self._channel_limiter.wait_time(adapter.name)
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self._channel_limiter.record(adapter.name)
+
+        try:
+            await adapter.send(job["phone"], job["message"])
+        except Exception as e:
+            retry = getattr(e, "retry", True)
+            job["attempt"] += 1
+            if retry and job["attempt"] < self.max_attempts:
+                delay = self.retry_base * 2 ** (job["attempt"] - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"{adapter.name} notification to donor {job['donor_id']} failed ({e}); retrying in {delay:.1f}s")
+                self._observe(adapter.name, "retry")
+                self._retry_later(priority, job, delay)
+                return
+            logger.error(f"{adapter.name} notification to donor {job['donor_id']} failed: {e}")
+            self._observe(adapter.name, "failed")
+            if job["channel"] + 1 < len(self.adapters):
+                job["channel"] += 1
+                job["attempt"] = 0
+                self._retry_later(priority, job, 0)
+            return
+        self._observe(adapter.name, "sent")
+
+    def stats(self):
+        return {
+            "channels": [adapter.name for adapter in self.adapters],
+            "workers": len(self._tasks),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "retries_pending": len(self._retry_handles),
+        }
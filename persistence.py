@@ -0,0 +1,349 @@
+# Append-only journal persistence for Blood Donor Connect India
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+logger = logging.getLogger("blood-donor-india")
+
+
+class Journal:
+    """Snapshot file plus an append-only journal of mutations.
+
+    Each mutation is written as one compact JSON line to the journal file, so a
+    write costs O(record) instead of O(all records). fsync is batched: it runs
+    once every ``fsync_every`` records or ``fsync_interval`` seconds, whichever
+    comes first. Once the journal holds ``compact_every`` records it should be
+    folded into the snapshot with ``compact()``.
+
+    Records are donor and request inserts ("donor", "request") and
+    "donor_update" entries, which set fields on an existing donor by id.
+
+    Every journal record carries a sequence number and the snapshot stores the
+    last sequence number it contains, so a crash between writing the snapshot
+    and truncating the journal never replays a record twice.
+    """
+
+    def __init__(self, snapshot_path, fsync_every=32, fsync_interval=1.0, compact_every=5000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.seq = 0
+        self.records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, kind, record):
+        """Append one mutation to the journal"""
+        self.append_many([(kind, record)])
+
+    def append_many(self, entries, force_sync=False):
+        """Append a batch of (kind, record) mutations with a single write; returns the bytes written"""
+        lines = []
+        for kind, record in entries:
+            self.seq += 1
+            lines.append(json.dumps({"seq": self.seq, "op": kind, "data": record}, separators=(",", ":")))
+        payload = "\n".join(lines) + "\n"
+        f = self._open()
+        f.write(payload)
+        f.flush()
+        self.records += len(lines)
+        self._unsynced += len(lines)
+        if (force_sync or self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+        return len(payload.encode("utf-8"))
+
+    def sync(self):
+        """fsync any journal records written since the last sync"""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def needs_compaction(self):
+        return self.records >= self.compact_every
+
+    def compact(self, donors, requests):
+        """Write a full snapshot atomically and truncate the journal; returns the snapshot size in bytes"""
+        data = {
+            "donors": donors,
+            "requests": requests,
+            "journal_seq": self.seq,
+            "last_updated": datetime.now().isoformat()
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = os.fstat(f.fileno()).st_size
+        os.replace(tmp_path, self.snapshot_path)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+        self.records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        return size
+
+    def load(self):
+        """Load the snapshot and replay the journal on top of it"""
+        donors, requests = [], []
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            donors = data.get("donors", [])
+            requests = data.get("requests", [])
+            snapshot_seq = data.get("journal_seq", 0)
+
+        self.seq = snapshot_seq
+        self.records = 0
+        updates = []
+        if os.path.exists(self.journal_path):
+            good_offset = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        entry = None
+                    if entry is None or not line.endswith(b"\n"):
+                        # A torn final line from a crash mid-write; everything before it is intact
+                        logger.warning(f"Truncating corrupt journal tail at byte {good_offset} in {self.journal_path}")
+                        break
+                    good_offset += len(line)
+                    if entry["seq"] <= snapshot_seq:
+                        continue
+                    if entry["op"] == "donor":
+                        donors.append(entry["data"])
+                    elif entry["op"] == "request":
+                        requests.append(entry["data"])
+                    elif entry["op"] == "donor_update":
+                        updates.append(entry["data"])
+                    self.seq = entry["seq"]
+                    self.records += 1
+            if good_offset < os.path.getsize(self.journal_path):
+                # Drop the torn tail so new appends don't get glued onto it
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good_offset)
+        if updates:
+            # Records written before donor IDs existed are numbered by their 1-based position
+            by_id = {donor.get("id", position): donor for position, donor in enumerate(donors, 1)}
+            for update in updates:
+                donor = by_id.get(update["id"])
+                if donor is None:
+                    logger.warning(f"Skipping journaled update for unknown donor {update['id']}")
+                    continue
+                donor.update({key: value for key, value in update.items() if key != "id"})
+        return donors, requests
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+_MUTATIONS = "__mutations__"
+_COMPACT = "__compact__"
+_STOP = "__stop__"
+
+
+class PersistenceWriter:
+    """Background thread that owns the journal and keeps file I/O off the event loop.
+
+    Mutations go into a bounded queue. The writer takes the first pending item,
+    waits up to ``flush_interval`` seconds for more, and writes the whole batch
+    with one write (and one fsync). With ``durability="flush"`` each submitted
+    mutation gets a Future that resolves once its batch is on disk; with
+    ``durability="immediate"`` callers don't wait and fsync follows the
+    journal's own batching.
+
+    ``snapshot_source`` returns the live (donors, requests) lists. They are
+    append-only, so compaction snapshots only the prefix that has already been
+    journaled, keeping the snapshot consistent with its ``journal_seq``. That
+    only holds if mutations are submitted in the order they were appended.
+
+    ``observer``, if given, is called on the writer thread as
+    ``observer(operation, seconds, bytes_written)`` after every journal write
+    ("journal") and snapshot ("snapshot").
+    """
+
+    def __init__(self, journal, snapshot_source, max_queue=10000, flush_interval=0.01,
+                 durability="flush", max_batch=1000, observer=None):
+        if durability not in ("flush", "immediate"):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.journal = journal
+        self.snapshot_source = snapshot_source
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_batch = max_batch
+        self.observer = observer
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._journaled = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, pending=()):
+        """Start the writer thread.
+
+        Everything currently in the snapshot_source lists is treated as already
+        persisted, except trailing records of the insert kinds listed in
+        ``pending`` that the caller appended and is about to submit.
+        """
+        with self._lock:
+            if self.running:
+                return
+            donors, requests = self.snapshot_source()
+            self._journaled = {"donor": len(donors), "request": len(requests)}
+            for kind in pending:
+                # Only inserts extend the lists; updates such as "donor_update" change records in place
+                if kind in self._journaled:
+                    self._journaled[kind] -= 1
+            self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, kind, record, block=False):
+        """Queue a mutation. Returns a Future in flush mode, else None.
+
+        Raises queue.Full when the queue is full and ``block`` is False.
+        """
+        return self.submit_many([(kind, record)], block=block)
+
+    def submit_many(self, entries, block=False):
+        """Queue a list of (kind, record) mutations as one item, written together"""
+        if not self.running:
+            self.start(pending=[kind for kind, _ in entries])
+        future = Future() if self.durability == "flush" else None
+        self.queue.put((_MUTATIONS, entries, future), block=block)
+        return future
+
+    def request_compaction(self):
+        """Ask the writer to fold the journal into a snapshot; returns a Future"""
+        if not self.running:
+            self.start()
+        future = Future()
+        self.queue.put((_COMPACT, None, future))
+        return future
+
+    def close(self, timeout=30):
+        """Drain every queued mutation to disk and stop the writer thread"""
+        if not self.running:
+            self.journal.close()
+            return
+        self.queue.put((_STOP, None, None))
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Persistence writer did not drain within the shutdown timeout")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self.queue.get(timeout=self.journal.fsync_interval)
+            except queue.Empty:
+                self._sync()
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1][0] not in (_STOP, _COMPACT):
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            mutations = [item for item in batch if item[0] not in (_STOP, _COMPACT)]
+            if mutations:
+                self._write(mutations)
+            for kind, _, future in batch:
+                if kind == _COMPACT:
+                    self._compact(future)
+                elif kind == _STOP:
+                    stopping = True
+
+        # Anything that raced in behind the stop marker is still written
+        leftover = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] not in (_STOP, _COMPACT):
+                leftover.append(item)
+        if leftover:
+            self._write(leftover)
+        self.journal.close()
+
+    def _write(self, mutations):
+        entries = [entry for _, batch_entries, _ in mutations for entry in batch_entries]
+        start = time.perf_counter()
+        try:
+            written = self.journal.append_many(entries, force_sync=self.durability == "flush")
+        except Exception as e:
+            logger.error(f"Failed to journal {len(entries)} mutations: {e}")
+            for _, _, future in mutations:
+                if future is not None:
+                    future.set_exception(e)
+            return
+        self._observe("journal", start, written)
+        for kind, _ in entries:
+            self._journaled[kind] = self._journaled.get(kind, 0) + 1
+        for _, _, future in mutations:
+            if future is not None:
+                future.set_result(True)
+        if self.journal.needs_compaction():
+            self._compact(None)
+
+    def _compact(self, future):
+        start = time.perf_counter()
+        try:
+            donors, requests = self.snapshot_source()
+            donors = donors[:self._journaled.get("donor", 0)]
+            requests = requests[:self._journaled.get("request", 0)]
+            written = self.journal.compact(donors, requests)
+            self._observe("snapshot", start, written)
+            logger.info(f"Data saved: {len(donors)} donors, {len(requests)} requests")
+        except Exception as e:
+            logger.error(f"Failed to save data: {e}")
+            if future is not None:
+                future.set_exception(e)
+            return
+        if future is not None:
+            future.set_result(True)
+
+    def _observe(self, operation, start, written):
+        if self.observer is not None:
+            try:
+                self.observer(operation, time.perf_counter() - start, written)
+            except Exception as e:
+                logger.error(f"Persistence observer failed: {e}")
+
+    def _sync(self):
+        try:
+            self.journal.sync()
+        except Exception as e:
+            logger.error(f"Failed to fsync journal: {e}")
@@ -0,0 +1,83 @@
+# Sampling profiler that writes flamegraph-ready collapsed stacks
+
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger("blood-donor-india")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds from a background thread.
+
+    Identical stacks are counted and written to ``output_path`` in the
+    collapsed-stack format ("root;caller;leaf count" per line). flamegraph.pl,
+    speedscope and inferno read it directly. The file is rewritten every
+    ``flush_interval`` seconds and on ``stop()``, so a crashed process still
+    leaves a recent profile behind.
+    """
+
+    def __init__(self, output_path, interval=0.005, thread_id=None, flush_interval=10.0):
+        self.output_path = output_path
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.flush_interval = flush_interval
+        self.samples = 0
+        self._counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler writing to {self.output_path} every {self.flush_interval}s")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        stack = ";".join(reversed(labels))
+        self._counts[stack] = self._counts.get(stack, 0) + 1
+        self.samples += 1
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if time.monotonic() >= next_flush:
+                self.write()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def write(self):
+        """Write the collapsed stacks collected so far"""
+        counts = dict(self._counts)
+        tmp_path = self.output_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(counts.items()):
+                    f.write(f"{stack} {count}\n")
+            os.replace(tmp_path, self.output_path)
+        except OSError as e:
+            logger.error(f"Failed to write profile to {self.output_path}: {e}")
@@ -0,0 +1,95 @@
+# In-process response cache for read-only tools, with generation-based invalidation
+
+import time
+from collections import OrderedDict
+
+
+def normalise_arguments(tool, arguments):
+    """Hashable cache key for a tool call: argument names sorted, string values trimmed and lowercased"""
+    items = []
+    for name, value in sorted((arguments or {}).items()):
+        if isinstance(value, str):
+            value = value.strip().lower()
+        elif isinstance(value, (list, dict)):
+            value = repr(value)
+        items.append((name, value))
+    return (tool, tuple(items))
+
+
+class ResponseCache:
+    """LRU cache of rendered tool responses with a TTL and scoped invalidation.
+
+    Each entry records the scopes it was computed from, such as a
+    (city, blood_type) pair of donors a search could have returned, and the
+    generation of each scope at that time. A write bumps only the
+    generations of the scopes it touches. Entries that depend on a bumped
+    scope turn stale, and entries over other scopes stay warm.
+    ``invalidate_all()`` drops everything, e.g. after the donor set is
+    reloaded.
+
+    Entries also expire ``ttl`` seconds after they are stored. Beyond
+    ``max_entries`` the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The cached value for `key`, or None when missing, expired or invalidated"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires, epoch, dependencies = entry
+        generations = self._generations
+        if (epoch != self._epoch or expires < time.monotonic()
+                or any(generations.get(scope, 0) != generation for scope, generation in dependencies)):
+            del self._entries[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, scopes=()):
+        """Store `value`, to be invalidated when any of `scopes` is bumped"""
+        generations = self._generations
+        dependencies = tuple((scope, generations.get(scope, 0)) for scope in set(scopes))
+        self._entries[key] = (value, time.monotonic() + self.ttl, self._epoch, dependencies)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def bump(self, scope):
+        """Invalidate every entry computed from `scope`"""
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def invalidate_all(self):
+        self._epoch += 1
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,206 @@
+# Grid-based spatial index and distance engine over donor coordinates, partitioned by blood type
+
+import heapq
+import math
+from array import array
+
+from geopy.distance import geodesic
+
+# Shortest length of one degree of latitude (at the equator), so bounding boxes never undershoot
+KM_PER_DEG_LAT = 110.574
+# Length of one degree of longitude at the equator
+KM_PER_DEG_LNG = 111.320
+# Mean Earth radius used by the haversine approximation
+EARTH_RADIUS_KM = 6371.0088
+# Haversine on the mean sphere is within ~0.56% of the WGS-84 geodesic; keep a margin on top
+HAVERSINE_ERROR = 0.0075
+# Distances are reported rounded to 2 decimals, so anything this close can tie with the last winner
+ROUNDING_SLACK_KM = 0.01
+
+
+def haversine_km(lat, lng, lats, lngs, positions):
+    """Great-circle distances from (lat, lng) to every donor position, in one pass.
+
+    ``lats``/``lngs`` are contiguous float arrays in degrees indexed by donor
+    position. Returns a list of kilometres aligned with ``positions``.
+    """
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    lat0 = radians(lat)
+    lng0 = radians(lng)
+    cos_lat0 = cos(lat0)
+    diameter = 2 * EARTH_RADIUS_KM
+    out = []
+    append = out.append
+    for pos in positions:
+        lat1 = radians(lats[pos])
+        half_dlat = sin((lat1 - lat0) * 0.5)
+        half_dlng = sin((radians(lngs[pos]) - lng0) * 0.5)
+        a = half_dlat * half_dlat + cos_lat0 * cos(lat1) * half_dlng * half_dlng
+        append(diameter * asin(sqrt(min(a, 1.0))))
+    return out
+
+
+def bounding_box(lat, lng, radius_km):
+    """Conservative (lat_min, lat_max, lng_min, lng_max) around a radius, in degrees.
+
+    Returns None when the box would touch a pole or cross the antimeridian,
+    meaning every point is a candidate.
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    lat_min, lat_max = lat - dlat, lat + dlat
+    # Longitude degrees shrink towards the poles; size the box for the widest latitude in it
+    widest = min(max(abs(lat_min), abs(lat_max)), 89.9)
+    dlng = radius_km / (KM_PER_DEG_LNG * math.cos(math.radians(widest)))
+    if lat_max >= 90 or lat_min <= -90 or dlng >= 180 or abs(lng) + dlng > 180:
+        return None
+    return lat_min, lat_max, lng - dlng, lng + dlng
+
+
+def rank_within_radius(candidates, lats, lngs, lat, lng, radius_km, limit):
+    """Exact radius filter and top-``limit`` ranking over pre-screened candidates.
+
+    ``candidates`` is a list of (position, rank) where rank 0 marks the
+    preferred blood type; ``lats``/``lngs`` are indexable by position. Returns
+    (total_matches, winners), where ``winners`` holds up to ``limit``
+    (geodesic_km, position) tuples ordered by rank, then distance rounded to 2
+    decimals, then position, which is the order a stable sort of the donor
+    list by rounded distance produces.
+
+    Haversine screens every candidate; geopy's geodesic only runs for
+    candidates inside the haversine error band around ``radius_km`` and for
+    those that can still rank among the first ``limit``.
+    """
+    if not candidates:
+        return 0, []
+
+    origin = (lat, lng)
+    exact = {}
+
+    def geodesic_km(pos):
+        # Donors registered at the same hospital share coordinates, so memoise per point
+        point = (lats[pos], lngs[pos])
+        distance = exact.get(point)
+        if distance is None:
+            distance = exact[point] = geodesic(origin, point).kilometers
+        return distance
+
+    inner = radius_km * (1 - HAVERSINE_ERROR)
+    outer = radius_km * (1 + HAVERSINE_ERROR)
+    positions = [pos for pos, _ in candidates]
+    survivors = []
+    for (pos, rank), approx in zip(candidates, haversine_km(lat, lng, lats, lngs, positions)):
+        if approx < inner or (approx <= outer and geodesic_km(pos) <= radius_km):
+            survivors.append((rank, approx, pos))
+    if not survivors:
+        return 0, []
+
+    if limit <= 0:
+        return len(survivors), []
+    # Bounded selection instead of sorting every match: only the limit-th haversine winner matters
+    kth_rank, kth_approx, _ = heapq.nsmallest(limit, survivors)[-1]
+    # Anything that can still outrank it once exact distances are known
+    cutoff = (kth_approx * (1 + HAVERSINE_ERROR) + ROUNDING_SLACK_KM) / (1 - HAVERSINE_ERROR)
+    contenders = []
+    for rank, approx, pos in survivors:
+        if rank < kth_rank or (rank == kth_rank and approx <= cutoff):
+            distance = geodesic_km(pos)
+            contenders.append((rank, round(distance, 2), pos, distance))
+    winners = heapq.nsmallest(limit, contenders)
+    return len(survivors), [(distance, pos) for _, _, pos, distance in winners]
+
+
+class DonorGridIndex:
+    """Uniform lat/lng grid of donor positions, partitioned by blood type.
+
+    Donors are referenced by their position in the donor list. Each grid cell
+    holds one bucket per blood type, so a query for several compatible types
+    walks the cells once. A radius query turns the circle into a conservative
+    lat/lng bounding box and only visits the cells that overlap it, so exact
+    distances are computed for the donors in those cells instead of for every
+    donor.
+
+    Coordinates are also kept in contiguous float arrays indexed by position,
+    which ``nearest()`` feeds to a batched haversine pass.
+    """
+
+    def __init__(self, cell_deg=0.1):
+        self.cell_deg = cell_deg
+        self._cells = {}
+        self._lats = array("d")
+        self._lngs = array("d")
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def add(self, idx, blood_type, lat, lng):
+        """Index one donor; call for every donor appended to the list"""
+        if idx != len(self._lats):
+            raise ValueError(f"Donor position {idx} is out of sequence (expected {len(self._lats)})")
+        self._lats.append(lat)
+        self._lngs.append(lng)
+        buckets = self._cells.setdefault(self._cell(lat, lng), {})
+        buckets.setdefault(blood_type, array("I")).append(idx)
+
+    def clear(self):
+        self._cells = {}
+        self._lats = array("d")
+        self._lngs = array("d")
+
+    def __len__(self):
+        return len(self._lats)
+
+    def coordinates(self, idx):
+        return self._lats[idx], self._lngs[idx]
+
+    def _cells_in_range(self, lat, lng, radius_km):
+        """Yield the per-type buckets of every occupied cell overlapping the radius bounding box"""
+        cells = self._cells
+        box = bounding_box(lat, lng, radius_km)
+        if box is None:
+            yield from cells.values()
+            return
+
+        lat_min, lat_max, lng_min, lng_max = box
+        row_min, col_min = self._cell(lat_min, lng_min)
+        row_max, col_max = self._cell(lat_max, lng_max)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(cells):
+            # Large radius over a sparse grid: walking the occupied cells is cheaper
+            for (row, col), buckets in cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    yield buckets
+            return
+
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                buckets = cells.get((row, col))
+                if buckets:
+                    yield buckets
+
+    def candidates(self, blood_types, lat, lng, radius_km):
+        """Yield (position, rank) for donors whose cell overlaps the radius bounding box.
+
+        ``rank`` is 0 for donors of ``blood_types[0]`` and 1 for the other
+        listed types. This is a superset of the donors within ``radius_km``;
+        callers still check the exact distance.
+        """
+        primary = blood_types[0]
+        for buckets in self._cells_in_range(lat, lng, radius_km):
+            for blood_type in blood_types:
+                bucket = buckets.get(blood_type)
+                if bucket:
+                    rank = 0 if blood_type == primary else 1
+                    for pos in bucket:
+                        yield pos, rank
+
+    def nearest(self, blood_types, lat, lng, radius_km, limit, skip=None):
+        """Find donors of any of ``blood_types`` within ``radius_km``.
+
+        Returns (total_matches, winners) as described in rank_within_radius():
+        donors of ``blood_types[0]`` first, then nearest first. Positions for
+        which ``skip(position)`` is true are not considered at all.
+        """
+        if skip is None:
+            candidates = list(self.candidates(blood_types, lat, lng, radius_km))
+        else:
+            candidates = [(pos, rank) for pos, rank in self.candidates(blood_types, lat, lng, radius_km) if not skip(pos)]
+        return rank_within_radius(candidates, self._lats, self._lngs, lat, lng, radius_km, limit)
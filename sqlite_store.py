@@ -0,0 +1,399 @@
+# SQLite storage backend: donors and requests in an embedded database
+#
+# Migrate an existing JSON data file with:
+#     python sqlite_store.py migrate [blood_donor_data.json] [blood_donor_data.db]
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+
+from spatial_index import bounding_box, rank_within_radius
+
+logger = logging.getLogger("blood-donor-india")
+
+DONOR_COLUMNS = ("id", "name", "blood_type", "city", "hospital", "phone", "latitude", "longitude")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS donors (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    blood_type TEXT NOT NULL,
+    city TEXT NOT NULL,
+    hospital TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_donors_blood_type_city ON donors (blood_type, city);
+CREATE INDEX IF NOT EXISTS idx_donors_city ON donors (city);
+CREATE INDEX IF NOT EXISTS idx_donors_hospital ON donors (hospital);
+CREATE INDEX IF NOT EXISTS idx_donors_phone ON donors (phone);
+CREATE VIRTUAL TABLE IF NOT EXISTS donor_locations USING rtree (
+    id, min_lat, max_lat, min_lng, max_lng
+);
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    record_id INTEGER,
+    origin INTEGER NOT NULL,
+    city TEXT,
+    blood_type TEXT
+);
+"""
+
+# Changes kept by checkpoint(); a process further behind than this gets a "reset"
+CHANGE_LOG_RETAIN = 100000
+# Seconds a write waits for another process to release the database's write lock
+BUSY_TIMEOUT = 5.0
+
+
+class StoreBusy(Exception):
+    """Another process held the write lock for longer than BUSY_TIMEOUT; the write was not made"""
+
+
+class SqliteDonorStore:
+    """Donor store backed by SQLite in WAL mode, with the same query API as DonorStore.
+
+    Donors live in one table, indexed on (blood_type, city), city, hospital and
+    phone. Their coordinates are also kept in an R*Tree, so a radius search is
+    an indexed bounding-box query. The exact distance filter and ranking then
+    run on the returned rows, exactly as for the in-memory grid.
+    Emergency requests are stored as JSON in their own table.
+
+    Each write runs in its own ``BEGIN IMMEDIATE`` transaction on a dedicated
+    write connection and is committed before it returns. It may wait up to
+    BUSY_TIMEOUT seconds for another process's write lock, so callers should
+    run writes off the event loop. Reads share a second connection behind a
+    lock; in WAL mode they never wait for writers.
+
+    Every write also appends a row to the ``changes`` table, tagged with the
+    writing process. Several processes can share one database file; each
+    calls ``sync()`` to learn what the others committed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.origin = os.getpid()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript(SCHEMA)
+        self._writer.commit()
+        self._conn = self._connect()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM donors").fetchone()[0]
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write(self, write):
+        """Run `write()` in one BEGIN IMMEDIATE transaction and commit it; returns its result.
+
+        Raises StoreBusy if another process keeps the write lock past BUSY_TIMEOUT.
+        """
+        with self._write_lock:
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    result = write()
+                    self._writer.commit()
+                except BaseException:
+                    self._writer.rollback()
+                    raise
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    raise StoreBusy(f"The database at {self.path} is locked by another writer") from e
+                raise
+        return result
+
+    def _donor(self, row):
+        donor = {column: row[column] for column in DONOR_COLUMNS}
+        if row["extra"]:
+            donor.update(json.loads(row["extra"]))
+        return donor
+
+    def _insert(self, donor_id, donor):
+        extra = {key: value for key, value in donor.items() if key not in DONOR_COLUMNS}
+        cursor = self._writer.execute(
+            "INSERT INTO donors (id, name, blood_type, city, hospital, phone, latitude, longitude, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (donor_id, donor["name"], donor["blood_type"], donor["city"], donor["hospital"], donor["phone"],
+             donor["latitude"], donor["longitude"], json.dumps(extra) if extra else None))
+        donor_id = cursor.lastrowid
+        self._writer.execute(
+            "INSERT INTO donor_locations (id, min_lat, max_lat, min_lng, max_lng) VALUES (?, ?, ?, ?, ?)",
+            (donor_id, donor["latitude"], donor["latitude"], donor["longitude"], donor["longitude"]))
+        return donor_id
+
+    def _log_change(self, kind, record_id=None, city=None, blood_type=None):
+        self._writer.execute("INSERT INTO changes (kind, record_id, origin, city, blood_type) VALUES (?, ?, ?, ?, ?)",
+                           (kind, record_id, self.origin, city, blood_type))
+
+    def _clear(self):
+        self._writer.execute("DELETE FROM donors")
+        self._writer.execute("DELETE FROM donor_locations")
+        self._writer.execute("DELETE FROM requests")
+        self._log_change("reset")
+
+    def clear(self):
+        self._write(self._clear)
+        self._count = 0
+
+    def load(self, donors, requests=()):
+        """Replace the contents with previously persisted donors and requests, in one transaction"""
+        def load():
+            self._clear()
+            for position, donor in enumerate(donors, 1):
+                # Records written before donor IDs existed get their 1-based list position
+                self._insert(donor.get("id", position), donor)
+            for position, request in enumerate(requests, 1):
+                # As for donors, requests written before they had ids get their 1-based position
+                self._insert_request(request.get("id", position), request)
+        self._write(load)
+        self._count = len(donors)
+
+    def add(self, donor):
+        """Insert and commit a new donor, assigning its id; returns the stored record"""
+        return self.add_many([donor])[0]
+
+    def add_many(self, donors):
+        """Insert and commit new donors in one transaction; returns the stored records"""
+        def add():
+            donor_ids = []
+            for donor in donors:
+                donor_id = self._insert(None, donor)
+                self._log_change("donor", donor_id, donor["city"], donor["blood_type"])
+                donor_ids.append(donor_id)
+            return donor_ids
+        donor_ids = self._write(add)
+        self._count += len(donor_ids)
+        return [{"id": donor_id, **{key: value for key, value in donor.items() if key != "id"}}
+                for donor_id, donor in zip(donor_ids, donors)]
+
+    def add_donation(self, donor_id, donated_on):
+        """Add an ISO donation date to a donor's history; returns (donor, False if it was already there).
+
+        The history is read and extended in one write transaction, so
+        donations recorded by several processes at once are all kept.
+        Raises KeyError for an unknown id.
+        """
+        def add():
+            row = self._writer.execute("SELECT * FROM donors WHERE id = ?", (donor_id,)).fetchone()
+            if row is None:
+                raise KeyError(donor_id)
+            donor = self._donor(row)
+            donations = donor.get("donations", [])
+            if donated_on in donations:
+                return donor, False
+            donor["donations"] = sorted(donations + [donated_on])
+            extra = {key: value for key, value in donor.items() if key not in DONOR_COLUMNS}
+            self._writer.execute("UPDATE donors SET extra = ? WHERE id = ?", (json.dumps(extra), donor_id))
+            self._log_change("donor_update", donor_id, row["city"], row["blood_type"])
+            return donor, True
+        return self._write(add)
+
+    def _insert_request(self, request_id, request):
+        data = {key: value for key, value in request.items() if key != "id"}
+        cursor = self._writer.execute("INSERT INTO requests (id, data) VALUES (?, ?)", (request_id, json.dumps(data)))
+        return cursor.lastrowid
+
+    @staticmethod
+    def _request(row):
+        return {"id": row["id"], **json.loads(row["data"])}
+
+    def add_request(self, request):
+        """Insert and commit a new request, assigning its id; returns the stored record"""
+        def add():
+            request_id = self._insert_request(None, request)
+            self._log_change("request", request_id)
+            return request_id
+        request_id = self._write(add)
+        return {"id": request_id, **{key: value for key, value in request.items() if key != "id"}}
+
+    def load_requests(self, up_to_id=None):
+        """Stored requests in insertion order, optionally only those with an id of at most `up_to_id`"""
+        sql, params = "SELECT id, data FROM requests ORDER BY id", ()
+        if up_to_id is not None:
+            sql, params = "SELECT id, data FROM requests WHERE id <= ? ORDER BY id", (up_to_id,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._request(row) for row in rows]
+
+    def requests_by_id(self, request_ids):
+        placeholders = ", ".join("?" for _ in request_ids)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, data FROM requests WHERE id IN ({placeholders}) ORDER BY id",
+                                      tuple(request_ids)).fetchall()
+        return [self._request(row) for row in rows]
+
+    def snapshot(self):
+        """(newest change seq, newest request id), read together; also recounts the donors as of that point.
+
+        Load requests with ``load_requests(up_to_id)`` and follow ``sync()``
+        from the returned seq to see every later change exactly once.
+        """
+        with self._lock:
+            # One read transaction, so all three come from the same committed state
+            self._conn.execute("BEGIN")
+            try:
+                seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+                request_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM requests").fetchone()[0]
+                self._count = self._conn.execute("SELECT COUNT(*) FROM donors").fetchone()[0]
+            finally:
+                self._conn.commit()
+        return seq, request_id
+
+    def sync(self, after_seq, limit=1000):
+        """Changes committed after `after_seq`, oldest first, as dicts.
+
+        Donors inserted by other processes are added to the cached count. If
+        the contents were replaced, or changes after `after_seq` were already
+        trimmed away, the result is a single "reset" change instead: reload
+        everything derived from the store, starting from ``snapshot()``.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                                      (after_seq, limit)).fetchall()
+            changes = [dict(row) for row in rows]
+            # AUTOINCREMENT leaves no gaps of its own, so a gap means checkpoint() trimmed unseen changes
+            trimmed = changes and changes[0]["seq"] > after_seq + 1 and \
+                self._conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0] > after_seq + 1
+            if trimmed or any(change["kind"] == "reset" for change in changes):
+                return [{"seq": changes[-1]["seq"], "kind": "reset", "record_id": None, "origin": None,
+                         "city": None, "blood_type": None}]
+            self._count += sum(1 for change in changes if change["kind"] == "donor" and change["origin"] != self.origin)
+        return changes
+
+    def checkpoint(self):
+        """Trim the change log to the last CHANGE_LOG_RETAIN entries and fold the WAL back into the main database file"""
+        self._write(lambda: self._writer.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                                                 (CHANGE_LOG_RETAIN,)))
+        with self._write_lock:
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        with self._write_lock:
+            self._writer.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.page(0, self._count))
+
+    @property
+    def records(self):
+        return list(self)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._donor(row) for row in rows]
+
+    def get(self, donor_id):
+        donors = self._query("SELECT * FROM donors WHERE id = ?", (donor_id,))
+        return donors[0] if donors else None
+
+    def by_blood_type(self, blood_type):
+        return self._query("SELECT * FROM donors WHERE blood_type = ? ORDER BY id", (blood_type,))
+
+    def by_city(self, city):
+        return self._query("SELECT * FROM donors WHERE city = ? ORDER BY id", (city,))
+
+    def by_hospital(self, hospital_name):
+        return self._query("SELECT * FROM donors WHERE hospital = ? ORDER BY id", (hospital_name,))
+
+    def by_phone(self, phone):
+        return self._query("SELECT * FROM donors WHERE phone = ? ORDER BY id", (phone,))
+
+    def with_field(self, name):
+        """Donors whose record carries the non-indexed field `name`"""
+        return self._query("SELECT * FROM donors WHERE json_extract(extra, ?) IS NOT NULL ORDER BY id", (f"$.{name}",))
+
+    def page(self, start_index, limit):
+        """Donors in registration order, as a slice"""
+        return self._query("SELECT * FROM donors ORDER BY id LIMIT ? OFFSET ?", (limit, start_index))
+
+    def scan(self, after_id=None, limit=100, blood_type=None, city=None, hospital=None):
+        """Up to `limit` donors with an id above `after_id`, in registration order, optionally filtered"""
+        clauses, params = [], []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        for column, value in (("blood_type", blood_type), ("city", city), ("hospital", hospital)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM donors{where} ORDER BY id LIMIT ?", (*params, limit))
+
+    def nearest(self, blood_types, lat, lng, radius_km, limit, exclude=None):
+        """Radius search; returns (total_matches, [(distance_km, donor), ...]) for up to `limit` winners.
+
+        Donors whose id is in `exclude` are left out before counting and ranking.
+        """
+        placeholders = ", ".join("?" for _ in blood_types)
+        box = bounding_box(lat, lng, radius_km)
+        if box is None:
+            sql = f"SELECT id, blood_type, latitude, longitude FROM donors WHERE blood_type IN ({placeholders}) ORDER BY id"
+            params = tuple(blood_types)
+        else:
+            lat_min, lat_max, lng_min, lng_max = box
+            # Overlap tests, because the R*Tree rounds stored coordinates outwards to 32-bit floats
+            sql = ("SELECT d.id, d.blood_type, d.latitude, d.longitude FROM donor_locations AS r "
+                   "JOIN donors AS d ON d.id = r.id "
+                   "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ? "
+                   f"AND d.blood_type IN ({placeholders}) ORDER BY d.id")
+            params = (lat_min, lat_max, lng_min, lng_max, *blood_types)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if exclude:
+            rows = [row for row in rows if row["id"] not in exclude]
+
+        primary = blood_types[0]
+        candidates = [(pos, 0 if row["blood_type"] == primary else 1) for pos, row in enumerate(rows)]
+        lats = [row["latitude"] for row in rows]
+        lngs = [row["longitude"] for row in rows]
+        total, winners = rank_within_radius(candidates, lats, lngs, lat, lng, radius_km, limit)
+        if not winners:
+            return total, []
+        ids = [rows[pos]["id"] for _, pos in winners]
+        by_id = {donor["id"]: donor for donor in self._query(
+            f"SELECT * FROM donors WHERE id IN ({', '.join('?' for _ in ids)})", ids)}
+        return total, [(distance, by_id[donor_id]) for (distance, _), donor_id in zip(winners, ids)]
+
+
+def migrate(json_path, db_path):
+    """Import a JSON snapshot (plus its journal) into a SQLite database, replacing its contents"""
+    from persistence import Journal
+
+    donors, requests = Journal(json_path).load()
+    store = SqliteDonorStore(db_path)
+    store.load(donors, requests)
+    store.checkpoint()
+    store.close()
+    return len(donors), len(requests)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python sqlite_store.py migrate [json_path] [db_path]")
+        sys.exit(1)
+    json_path = sys.argv[2] if len(sys.argv) > 2 else "blood_donor_data.json"
+    db_path = sys.argv[3] if len(sys.argv) > 3 else "blood_donor_data.db"
+    donor_count, request_count = migrate(json_path, db_path)
+    print(f"Migrated {donor_count} donors and {request_count} requests from {json_path} to {db_path}")
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """The server module with empty state, persisting into a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    logging.disable(logging.INFO)
+    import official_mcp_server as server
+
+    server.writer.close()
+    server.load_data()
+    yield server
+    server.writer.close()
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def call(server):
+    """Run one tool call and return its text"""
+    def call_tool(tool, **arguments):
+        return asyncio.run(server.handle_call_tool(tool, arguments))[0].text
+    return call_tool
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+
+
+def post(server, payload):
+    async def send():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/mcp", json=payload)
+    return asyncio.run(send())
+
+
+def test_batch_answers_requests_in_order_and_skips_notifications(server):
+    response = post(server, [
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": "two", "method": "tools/call",
+         "params": {"name": "get_hospital_details", "arguments": {"city": "pune"}}},
+        {"jsonrpc": "2.0", "id": 3, "method": "no/such/method"},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert [entry["id"] for entry in body] == [1, "two", 3]
+    assert "tools" in body[0]["result"]
+    assert "Ruby Hall Clinic" in "".join(item["text"] for item in body[1]["result"]["content"])
+    assert body[2]["error"]["code"] == -32601
+
+
+def test_invalid_batch_entries_get_their_own_errors(server):
+    body = post(server, [
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+        42,
+        {"id": 2, "method": "tools/list"},
+    ]).json()
+    assert body[0]["id"] == 1 and "result" in body[0]
+    assert body[1] == body[2] == {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
+
+
+def test_batch_of_only_notifications_has_no_body(server):
+    response = post(server, [{"jsonrpc": "2.0", "method": "notifications/initialized"}])
+    assert response.status_code == 204
+
+
+def test_batch_size_is_limited(server, monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH_SIZE", 2)
+    body = post(server, [{"jsonrpc": "2.0", "id": i, "method": "tools/list"} for i in range(3)]).json()
+    assert body["error"]["code"] == -32600
+    assert "limit 2" in body["error"]["message"]
+    assert post(server, []).json()["error"]["code"] == -32600
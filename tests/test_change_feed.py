@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+import pytest
+
+from change_feed import ChangeFeed, ChangeFeedGap
+
+
+def test_since_finds_changes_after_a_reset_that_skipped_ahead():
+    feed = ChangeFeed()
+    for i in range(3):
+        feed.publish("donor", "insert", {"id": i})
+    feed.reset(100)
+    for i in range(3):
+        feed.publish("donor", "insert", {"id": 10 + i})
+
+    assert [c.seq for c in feed.since(0)] == [1, 2, 3, 101, 102, 103, 104]
+    assert [c.seq for c in feed.since(3)] == [101, 102, 103, 104]
+    # Seqs 4-100 never existed, so asking from inside the jump isn't a gap
+    assert [c.seq for c in feed.since(50)] == [101, 102, 103, 104]
+    assert [c.seq for c in feed.since(101)] == [102, 103, 104]
+    assert [c.seq for c in feed.since(101, limit=2)] == [102, 103]
+    assert feed.since(104) == []
+
+
+def test_since_raises_once_wanted_changes_were_dropped():
+    feed = ChangeFeed(retain=3)
+    for i in range(2):
+        feed.publish("donor", "insert", {"id": i})
+    feed.reset(100)
+    feed.publish("donor", "insert", {"id": 2})
+
+    # 1 was dropped; 2, 101 and 102 are retained
+    assert [c.seq for c in feed.since(1)] == [2, 101, 102]
+    with pytest.raises(ChangeFeedGap):
+        feed.since(0)
+
+
+def test_changes_endpoint_is_only_served_by_a_single_worker(server, monkeypatch):
+    async def get_changes():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/changes", params={"after": 0})
+
+    server.change_feed.publish("donor", "insert", {"id": 1})
+    response = asyncio.run(get_changes())
+    assert response.status_code == 200
+    assert response.json()["changes"][-1]["record"] == {"id": 1}
+
+    monkeypatch.setattr(server, "WORKERS", 2)
+    assert asyncio.run(get_changes()).status_code == 404
+
+
+def test_stats_report_each_subscriber_position():
+    feed = ChangeFeed(retain=2)
+    feed.subscribe("counter", lambda change: None)
+    for i in range(3):
+        feed.publish("donor", "insert", {"id": i})
+    seen = feed.unsubscribe("counter")
+    feed.subscribe("late", lambda change: None, after_seq=seen)
+
+    assert feed.stats() == {"seq": 3, "retained": 2, "oldest_seq": 2, "subscribers": {"late": 3}}
@@ -0,0 +1,23 @@
+import re
+
+
+def test_compatibility_table_lists_the_exact_type_first(server):
+    table = server.COMPATIBLE_DONORS
+    assert set(table) == set(server.BLOOD_TYPES)
+    for recipient, donor_types in table.items():
+        assert donor_types[0] == recipient
+        assert "O-" in donor_types
+    assert set(table["AB+"]) == set(server.BLOOD_TYPES)
+    assert table["O-"] == ("O-",)
+
+
+def test_compatible_search_ranks_exact_matches_before_nearer_compatible_donors(call):
+    call("register_blood_donor", name="Near Universal", blood_type="O-", city="pune", hospital_name="Ruby Hall", phone="9000000001")
+    call("register_blood_donor", name="Far Exact", blood_type="A+", city="pune", hospital_name="Sahyadri", phone="9000000002")
+    call("register_blood_donor", name="Near Incompatible", blood_type="B+", city="pune", hospital_name="Ruby Hall", phone="9000000003")
+    call("register_blood_donor", name="Near Compatible", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9000000004")
+    search = dict(blood_type="A+", city="pune", hospital_name="Ruby Hall")
+
+    compatible = call("find_nearby_donors", include_compatible=True, **search)
+    assert re.findall(r"^\d+\. (.+) \(Pune\)$", compatible, re.M) == ["Far Exact", "Near Universal", "Near Compatible"]
+    assert re.findall(r"^\d+\. (.+) \(Pune\)$", call("find_nearby_donors", **search), re.M) == ["Far Exact"]
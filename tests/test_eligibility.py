@@ -0,0 +1,45 @@
+import functools
+import time
+from datetime import date, datetime
+
+from eligibility import EligibilityIndex
+
+
+def at(day):
+    return datetime.fromisoformat(day).timestamp()
+
+
+def test_donor_is_ineligible_until_the_interval_has_passed():
+    index = EligibilityIndex(interval_days=90)
+    index.load([{"id": 1, "donations": ["2026-01-01"]}, {"id": 2, "donations": ["2025-01-01"]}, {"id": 3}],
+               now=at("2026-01-10"))
+    assert set(index.ineligible) == {1}
+
+    assert index.release_due(now=at("2026-03-31")) == []
+    assert index.release_due(now=at("2026-04-01")) == [1]
+    assert len(index) == 0
+
+
+def test_a_later_donation_pushes_the_release_back():
+    index = EligibilityIndex(interval_days=90)
+    index.track({"id": 1, "donations": ["2026-01-01"]}, now=at("2026-01-10"))
+    index.track({"id": 1, "donations": ["2026-01-01", "2026-02-01"]}, now=at("2026-02-02"))
+
+    # The first donation's heap entry is stale and doesn't release the donor
+    assert index.release_due(now=at("2026-04-15")) == []
+    assert 1 in index.ineligible
+    assert index.release_due(now=at("2026-05-02")) == [1]
+
+
+def test_released_donor_reappears_in_cached_search_without_a_change(server, call, monkeypatch):
+    call("register_blood_donor", name="Asha", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9876500001")
+    call("record_donation", donor_id=1, donated_on=date.today().isoformat())
+    search = dict(blood_type="O+", city="pune", hospital_name="Ruby Hall")
+    assert "Asha" not in call("find_nearby_donors", **search)
+    seq = server.change_feed.seq
+
+    # 91 days on, the donor's waiting period is over
+    release_due = functools.partial(server.eligibility.release_due, now=time.time() + 91 * 86400)
+    monkeypatch.setattr(server.eligibility, "release_due", release_due)
+    assert "Asha" in call("find_nearby_donors", **search)
+    assert server.change_feed.seq == seq
@@ -0,0 +1,30 @@
+from hospital_index import HospitalIndex
+
+
+def names(result):
+    status, found = result
+    if status == "multiple":
+        return sorted(hospital["name"] for hospital, _ in found)
+    return None if status is None else status["name"]
+
+
+def test_typos_and_extra_words_resolve_to_the_intended_hospital(server):
+    find = server.find_hospital_by_name
+    assert names(find("AIIMS delhi hosp")) == "AIIMS Delhi"
+    assert names(find("kem pune")) == "KEM Hospital Pune"
+    assert names(find("apolo", "chennai")) == "Apollo Hospital Chennai"
+    # Without a city every Apollo branch is offered, not a "not found"
+    assert names(find("apolo")) == sorted(hospital["name"] for hospitals in server.HOSPITALS.values()
+                                          for hospital in hospitals if hospital["name"].startswith("Apollo"))
+    assert find("zzzz") == (None, None)
+
+
+def test_resolved_queries_are_cached_until_the_table_changes():
+    hospitals = {"pune": [{"name": "Ruby Hall Clinic"}, {"name": "Sahyadri Hospital"}]}
+    index = HospitalIndex(hospitals)
+    assert index.find("rubby hall")[0]["name"] == "Ruby Hall Clinic"
+    assert index.find("rubby hall")[0]["name"] == "Ruby Hall Clinic"
+    assert index.cache_info().hits == 1
+
+    hospitals["mumbai"] = [{"name": "Ruby Hall Clinic Mumbai"}]
+    assert index.find("rubby hall")[0] == "multiple"
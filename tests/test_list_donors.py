@@ -0,0 +1,44 @@
+import re
+
+
+def register(call, count, city="pune"):
+    hospital = {"pune": "Ruby Hall", "mumbai": "KEM"}[city]
+    for i in range(count):
+        call("register_blood_donor", name=f"{city.title()} {i}", blood_type="O+", city=city, hospital_name=hospital,
+             phone=f"98765{len(city)}{i:04d}")
+
+
+def next_cursor(text):
+    match = re.search(r"cursor=(\S+)", text)
+    return match.group(1) if match else None
+
+
+def test_cursor_pages_through_filtered_donors(server, call):
+    register(call, 3, "pune")
+    register(call, 2, "mumbai")
+
+    names = []
+    page = call("list_donors", city="pune", limit=2)
+    while True:
+        names += re.findall(r"#\d+ (\w+ \d+)", page)
+        cursor = next_cursor(page)
+        if cursor is None:
+            break
+        assert server.decode_cursor(cursor)[1] == {"city": "pune"}
+        # The cursor carries the filters, so later pages need only the cursor
+        page = call("list_donors", cursor=cursor, limit=2)
+    assert names == ["Pune 0", "Pune 1", "Pune 2"]
+
+
+def test_cursor_round_trips(server):
+    cursor = server.encode_cursor(42, {"city": "pune", "blood_type": "O+"})
+    assert server.decode_cursor(cursor) == (42, {"city": "pune", "blood_type": "O+"})
+
+
+def test_cursor_rejects_other_filters_and_garbage(server, call):
+    register(call, 3, "pune")
+    cursor = next_cursor(call("list_donors", city="pune", limit=1))
+
+    assert call("list_donors", cursor=cursor, city="pune", limit=1).startswith("🩸")
+    assert "issued for different filters" in call("list_donors", cursor=cursor, city="mumbai")
+    assert call("list_donors", cursor="not-a-cursor").startswith("❌ Invalid cursor")
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from notifications import NotificationDispatcher, StubAdapter
+
+
+def test_each_emergency_request_notifies_its_donors(server, call, monkeypatch):
+    monkeypatch.setattr(server, "notifier", NotificationDispatcher([StubAdapter()]))
+    call("register_blood_donor", name="Asha", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9876500001")
+    request = dict(patient_name="Ravi", blood_type="O+", city="pune", hospital_name="Ruby Hall")
+
+    first = call("emergency_blood_request", **request)
+    # A later request for the same patient, e.g. escalated to critical, still reaches the donor
+    second = call("emergency_blood_request", urgency="critical", **request)
+
+    assert first.startswith("🚨 Emergency request #1 ")
+    assert second.startswith("🚨 Emergency request #2 ")
+    assert "Notifying 1 donors" in first
+    assert "Notifying 1 donors" in second
+    assert [r["id"] for r in server.requests] == [1, 2]
+
+
+def test_repeated_enqueue_for_a_request_is_deduplicated():
+    async def enqueue_twice():
+        notifier = NotificationDispatcher([StubAdapter()])
+        donors = [{"id": 1, "phone": "9876500001"}, {"id": 2, "phone": "9876500002"}]
+        queued = [notifier.enqueue(7, donors, "message"), notifier.enqueue(7, donors, "message"),
+                  notifier.enqueue(8, donors, "message")]
+        await notifier.stop()
+        return queued
+
+    assert asyncio.run(enqueue_twice()) == [2, 0, 2]
+
+
+def test_channel_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        NotificationDispatcher([StubAdapter()], channel_rate=0)
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from persistence import Journal, PersistenceWriter
+
+
+def donor(donor_id, name="Donor"):
+    return {"id": donor_id, "name": name, "blood_type": "O+", "city": "pune", "hospital": "Ruby Hall Clinic",
+            "phone": f"98{donor_id:08d}", "latitude": 18.5196, "longitude": 73.8553}
+
+
+def test_crash_between_compaction_and_truncation_replays_nothing_twice(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    donors = [donor(1), donor(2)]
+    journal.append_many([("donor", d) for d in donors])
+    journal.close()
+    with open(journal.journal_path, "rb") as f:
+        stale_journal = f.read()
+
+    journal.compact(donors, [])
+    # Crash before the truncation reached disk: the old journal is still there next to the new snapshot
+    with open(journal.journal_path, "wb") as f:
+        f.write(stale_journal)
+
+    reloaded = Journal(path)
+    loaded_donors, loaded_requests = reloaded.load()
+    assert [d["id"] for d in loaded_donors] == [1, 2]
+    assert loaded_requests == []
+    assert reloaded.seq == 2
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.append_many([("donor", donor(1)), ("request", {"patient_name": "P"})])
+    journal.close()
+    with open(journal.journal_path, "ab") as f:
+        f.write(b'{"seq":3,"op":"donor","data":{"id"')
+
+    reloaded = Journal(path)
+    donors, requests = reloaded.load()
+    assert [d["id"] for d in donors] == [1]
+    assert requests == [{"patient_name": "P"}]
+    with open(journal.journal_path, "rb") as f:
+        assert f.read().endswith(b"}\n")
+
+    # New appends land after the intact records, not glued onto the torn tail
+    reloaded.append_many([("donor", donor(3))])
+    reloaded.close()
+    donors, _ = Journal(path).load()
+    assert [d["id"] for d in donors] == [1, 3]
+
+
+def test_donor_update_is_replayed_onto_its_donor(tmp_path):
+    path = str(tmp_path / "data.json")
+    journal = Journal(path)
+    journal.append_many([("donor", donor(1)), ("donor", donor(2))])
+    journal.compact([donor(1), donor(2)], [])
+    journal.append_many([("donor_update", {"id": 2, "donations": ["2026-01-05"]}),
+                         ("donor", donor(3)),
+                         ("donor_update", {"id": 3, "donations": ["2026-02-01"]}),
+                         ("donor_update", {"id": 99, "donations": ["2026-02-01"]})])
+    journal.close()
+
+    donors, _ = Journal(path).load()
+    by_id = {d["id"]: d for d in donors}
+    assert "donations" not in by_id[1]
+    assert by_id[2]["donations"] == ["2026-01-05"]
+    assert by_id[3]["donations"] == ["2026-02-01"]
+    assert 99 not in by_id
+
+
+def test_writer_accepts_an_update_as_its_first_mutation(tmp_path):
+    path = str(tmp_path / "data.json")
+    donors = [donor(1)]
+    journal = Journal(path)
+    journal.compact(donors, [])
+    writer = PersistenceWriter(journal, lambda: (donors, []))
+
+    # The writer isn't running yet, so submitting starts it
+    future = writer.submit_many([("donor_update", {"id": 1, "donations": ["2026-03-01"]})])
+    assert future.result(timeout=5) is True
+    writer.close()
+
+    with open(journal.journal_path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["op"] for entry in entries] == ["donor_update"]
+    loaded, _ = Journal(path).load()
+    assert loaded[0]["donations"] == ["2026-03-01"]
+
+
+def test_record_donation_survives_a_stopped_writer(server, call):
+    call("register_blood_donor", name="Asha", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9876500001")
+    server.writer.close()
+
+    result = call("record_donation", donor_id=1, donated_on="2026-01-10")
+    assert result.startswith("✅ Donation on 2026-01-10 recorded")
+    server.writer.close()
+
+    server.load_data()
+    assert server.donor_store.get(1)["donations"] == ["2026-01-10"]
+
+
+
+
+class SlowJournal(Journal):
+    """Takes a while per write and remembers which donor ids it has journaled"""
+
+    journaled = ()
+
+    def append_many(self, entries, force_sync=False):
+        time.sleep(0.02)
+        self.journaled = [*self.journaled, *(record["id"] for kind, record in entries if kind == "donor")]
+        return super().append_many(entries, force_sync)
+
+
+class LateExecutor(ThreadPoolExecutor):
+    """Starts every job a little late, like a busy default executor"""
+
+    def submit(self, fn, *args, **kwargs):
+        def late():
+            time.sleep(0.05)
+            return fn(*args, **kwargs)
+        return super().submit(late)
+
+
+def test_mutation_waiting_for_queue_room_keeps_its_place(server, monkeypatch):
+    journal = SlowJournal("slow.json", compact_every=1)
+    snapshots = []
+
+    def check_snapshot(operation, seconds, written):
+        if operation == "snapshot":
+            with open("slow.json", encoding="utf-8") as f:
+                snapshots.append((sorted(d["id"] for d in json.load(f)["donors"]), sorted(journal.journaled)))
+
+    slow_writer = PersistenceWriter(journal, lambda: (server.donor_store.records, server.requests),
+                                    max_queue=1, flush_interval=0, observer=check_snapshot)
+    monkeypatch.setattr(server, "writer", slow_writer)
+    monkeypatch.setattr(server, "submit_order", asyncio.Lock())
+
+    def register(i):
+        return asyncio.create_task(server.handle_call_tool("register_blood_donor", {
+            "name": f"Donor {i}", "blood_type": "O+", "city": "pune", "hospital_name": "Ruby Hall",
+            "phone": f"98765{i:05d}"}))
+
+    async def register_all():
+        asyncio.get_running_loop().set_default_executor(LateExecutor())
+        # 1 is being written and 2 fills the queue, so 3 has to wait for room on an executor thread
+        tasks = [register(1), register(2), register(3)]
+        await asyncio.sleep(0.03)
+        # By now the writer has taken 2, so there is room again before 3 gets to it
+        tasks.append(register(4))
+        await asyncio.gather(*tasks)
+    asyncio.run(register_all())
+    slow_writer.close()
+
+    assert journal.journaled == [1, 2, 3, 4]
+    for in_snapshot, journaled in snapshots:
+        assert in_snapshot == journaled
+    donors, _ = Journal("slow.json").load()
+    assert sorted(d["id"] for d in donors) == [1, 2, 3, 4]
@@ -0,0 +1,36 @@
+from response_cache import ResponseCache, normalise_arguments
+
+
+def test_bumping_a_scope_only_invalidates_entries_computed_from_it():
+    cache = ResponseCache()
+    cache.put("pune O+", "a", scopes=[("pune", "O+")])
+    cache.put("pune O+ or O-", "b", scopes=[("pune", "O+"), ("pune", "O-")])
+    cache.put("mumbai O+", "c", scopes=[("mumbai", "O+")])
+    cache.put("hospitals", "d")
+
+    cache.bump(("pune", "O+"))
+
+    assert cache.get("pune O+") is None
+    assert cache.get("pune O+ or O-") is None
+    assert cache.get("mumbai O+") == "c"
+    assert cache.get("hospitals") == "d"
+    assert cache.stats()["stale"] == 2
+
+
+def test_equivalent_arguments_share_a_key():
+    assert normalise_arguments("find_nearby_donors", {"city": " Pune", "blood_type": "o+"}) == \
+        normalise_arguments("find_nearby_donors", {"blood_type": "O+", "city": "pune"})
+
+
+def test_registration_keeps_searches_over_other_cities_cached(server, call):
+    pune = dict(blood_type="O+", city="pune", hospital_name="Ruby Hall")
+    call("find_nearby_donors", **pune)
+    hits = server.response_cache.hits
+
+    call("register_blood_donor", name="Mumbai Donor", blood_type="O+", city="mumbai", hospital_name="KEM", phone="9000000001")
+    call("find_nearby_donors", **pune)
+    assert server.response_cache.hits == hits + 1
+
+    call("register_blood_donor", name="Pune Donor", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9000000002")
+    assert "Pune Donor" in call("find_nearby_donors", **pune)
+    assert server.response_cache.hits == hits + 1
@@ -0,0 +1,94 @@
+import random
+
+from geopy.distance import geodesic
+
+from spatial_index import HAVERSINE_ERROR, DonorGridIndex, rank_within_radius
+
+PUNE = (18.5196, 73.8553)
+BLOOD_TYPES = ["O+", "A+", "B+", "AB+", "O-", "A-", "B-", "AB-"]
+
+
+def random_donors(count, seed=7, spread=0.6):
+    rng = random.Random(seed)
+    return [(rng.choice(BLOOD_TYPES), PUNE[0] + rng.uniform(-spread, spread), PUNE[1] + rng.uniform(-spread, spread))
+            for _ in range(count)]
+
+
+def brute_force(donors, blood_types, lat, lng, radius_km, limit):
+    """What find_nearby_donors returned before the index: a geodesic scan, stable-sorted by rounded distance"""
+    matches = []
+    for pos, (blood_type, donor_lat, donor_lng) in enumerate(donors):
+        if blood_type in blood_types:
+            distance = geodesic((lat, lng), (donor_lat, donor_lng)).kilometers
+            if distance <= radius_km:
+                matches.append((0 if blood_type == blood_types[0] else 1, round(distance, 2), pos, distance))
+    matches.sort()
+    return len(matches), [(distance, pos) for _, _, pos, distance in matches[:limit]]
+
+
+def build_index(donors):
+    index = DonorGridIndex()
+    # Added one at a time, as register_blood_donor does
+    for pos, (blood_type, lat, lng) in enumerate(donors):
+        index.add(pos, blood_type, lat, lng)
+    return index
+
+
+def test_grid_nearest_matches_a_full_geodesic_scan():
+    donors = random_donors(600)
+    index = build_index(donors)
+    for blood_types in (("O+",), ("AB-",), ("A+", "A-", "O+", "O-")):
+        for radius_km in (2, 10, 25, 200):
+            for limit in (1, 5, 50):
+                expected = brute_force(donors, blood_types, *PUNE, radius_km, limit)
+                assert index.nearest(blood_types, *PUNE, radius_km, limit) == expected
+
+
+def test_grid_candidates_cover_every_donor_in_range():
+    donors = random_donors(600, seed=11)
+    index = build_index(donors)
+    center = (18.9, 73.5)
+    for radius_km in (1, 15, 60):
+        in_range = {pos for pos, (blood_type, lat, lng) in enumerate(donors)
+                    if blood_type == "B+" and geodesic(center, (lat, lng)).kilometers <= radius_km}
+        candidates = {pos for pos, _ in index.candidates(("B+",), *center, radius_km)}
+        assert in_range <= candidates
+
+    # A small radius only visits nearby cells, not every B+ donor
+    all_b_positive = sum(1 for blood_type, _, _ in donors if blood_type == "B+")
+    assert len(list(index.candidates(("B+",), *center, 15))) < all_b_positive / 4
+
+
+def test_skipped_positions_are_left_out():
+    donors = random_donors(200, seed=3)
+    index = build_index(donors)
+    total, winners = index.nearest(("O+",), *PUNE, 50, 200)
+    skipped = {pos for _, pos in winners[::2]}
+    total_without, winners_without = index.nearest(("O+",), *PUNE, 50, 200, skip=skipped.__contains__)
+    assert total_without == total - len(skipped)
+    assert [pos for _, pos in winners_without] == [pos for _, pos in winners if pos not in skipped]
+
+
+def test_haversine_screening_keeps_boundary_donors_and_tie_order():
+    rng = random.Random(5)
+    radius_km = 10
+    donors = []
+    # Donors within the haversine error band either side of the radius, where only geodesic can decide
+    for _ in range(150):
+        distance = radius_km * rng.uniform(1 - 2 * HAVERSINE_ERROR, 1 + 2 * HAVERSINE_ERROR)
+        point = geodesic(kilometers=distance).destination(PUNE, rng.uniform(0, 360))
+        donors.append((rng.choice(("O+", "O-")), point.latitude, point.longitude))
+    # Several donors at one hospital tie on distance and must keep registration order
+    point = geodesic(kilometers=3.456).destination(PUNE, 40)
+    donors += [("O+", point.latitude, point.longitude)] * 4
+    lats = [lat for _, lat, _ in donors]
+    lngs = [lng for _, _, lng in donors]
+
+    for blood_types in (("O+",), ("O+", "O-")):
+        candidates = [(pos, 0 if blood_type == blood_types[0] else 1)
+                      for pos, (blood_type, _, _) in enumerate(donors) if blood_type in blood_types]
+        for limit in (3, 10, 400):
+            expected = brute_force(donors, blood_types, *PUNE, radius_km, limit)
+            assert rank_within_radius(candidates, lats, lngs, *PUNE, radius_km, limit) == expected
+        # The band really straddles the radius
+        assert 4 < expected[0] < len(candidates)
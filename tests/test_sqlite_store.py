@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlite_store
+from sqlite_store import SqliteDonorStore
+
+
+def use_sqlite(server, monkeypatch, path):
+    store = SqliteDonorStore(path)
+    monkeypatch.setattr(server, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(server, "donor_store", store)
+    server.load_data()
+    return store
+
+
+def test_commits_periodically_trim_the_change_log(server, call, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "SQLITE_CHECKPOINT_EVERY", 3)
+    monkeypatch.setattr(server, "commits_since_checkpoint", 0)
+    monkeypatch.setattr(sqlite_store, "CHANGE_LOG_RETAIN", 2)
+    store = use_sqlite(server, monkeypatch, str(tmp_path / "donors.db"))
+
+    for i in range(5):
+        call("register_blood_donor", name=f"Donor {i}", blood_type="O+", city="pune", hospital_name="Ruby Hall",
+             phone=f"98765000{i:02d}")
+
+    # The third commit checkpointed, dropping every change more than two behind seq 3
+    seqs = [row["seq"] for row in store._conn.execute("SELECT seq FROM changes ORDER BY seq")]
+    assert seqs == [2, 3, 4, 5]
+    assert len(store) == 5
+    store.close()
+
+
+def test_write_waiting_on_another_process_keeps_the_loop_running(server, call, tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "BUSY_TIMEOUT", 0.3)
+    path = str(tmp_path / "donors.db")
+    store = use_sqlite(server, monkeypatch, path)
+    asha = dict(name="Asha", blood_type="O+", city="pune", hospital_name="Ruby Hall", phone="9876500001")
+    call("register_blood_donor", **asha)
+
+    # Another worker holds the write lock
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def register_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        ticker = asyncio.create_task(tick())
+        result = await server.handle_call_tool("register_blood_donor", {**asha, "name": "Ravi"})
+        ticker.cancel()
+        return result[0].text, ticks
+
+    text, ticks = asyncio.run(register_while_ticking())
+    assert text.startswith("❌ The donor database is busy")
+    assert ticks >= 10
+    # Reads don't wait for the other writer
+    assert store.get(1)["name"] == "Asha"
+    assert len(store) == 1
+
+    other.rollback()
+    other.close()
+    assert call("register_blood_donor", **{**asha, "name": "Ravi"}).startswith("✅")
+    assert [donor["name"] for donor in store] == ["Asha", "Ravi"]
+    store.close()
+
+
+def test_donations_recorded_by_several_processes_at_once_are_all_kept(tmp_path):
+    path = str(tmp_path / "donors.db")
+    workers = [SqliteDonorStore(path), SqliteDonorStore(path)]
+    donor_id = workers[0].add({"name": "Asha", "blood_type": "O+", "city": "pune", "hospital": "Ruby Hall Clinic",
+                               "phone": "9876500001", "latitude": 18.5196, "longitude": 73.8553})["id"]
+    dates = [f"2026-0{month}-{day:02d}" for month in (1, 2) for day in range(1, 11)]
+
+    def record(i):
+        return workers[i % 2].add_donation(donor_id, dates[i])[1]
+    with ThreadPoolExecutor(8) as executor:
+        assert all(executor.map(record, range(len(dates))))
+
+    assert workers[1].get(donor_id)["donations"] == sorted(dates)
+    assert workers[0].add_donation(donor_id, dates[0])[1] is False
+    for store in workers:
+        store.close()
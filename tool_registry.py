@@ -0,0 +1,60 @@
+# Registry of MCP tools: handlers keyed by name, with schemas built once
+
+import json
+
+import mcp.types as types
+
+
+class ToolRegistry:
+    """Maps tool names to their ``types.Tool`` definition and async handler.
+
+    Tools are registered with the ``tool()`` decorator next to their
+    handler, so adding a tool does not touch the dispatcher. Schemas are
+    built when the tool is registered. The ``tools/list`` result is
+    serialised once and reused until another tool is registered.
+    """
+
+    def __init__(self):
+        self._tools = {}
+        self._handlers = {}
+        self._list_result = None
+        self._list_json = None
+
+    def tool(self, name, description, input_schema):
+        """Decorator registering ``handler(arguments) -> list[types.TextContent]`` as tool `name`"""
+        definition = types.Tool(name=name, description=description, inputSchema=input_schema)
+
+        def register(handler):
+            if name in self._tools:
+                raise ValueError(f"Tool {name} is already registered")
+            self._tools[name] = definition
+            self._handlers[name] = handler
+            self._list_result = self._list_json = None
+            return handler
+        return register
+
+    def __contains__(self, name):
+        return name in self._handlers
+
+    def handler(self, name):
+        """The handler registered for `name`, or None"""
+        return self._handlers.get(name)
+
+    def tools(self):
+        """Tool definitions in registration order"""
+        return list(self._tools.values())
+
+    def list_result(self):
+        """The ``tools/list`` result object, built once"""
+        if self._list_result is None:
+            self._list_result = {
+                "tools": [{"name": t.name, "description": t.description, "inputSchema": t.inputSchema}
+                          for t in self._tools.values()]
+            }
+        return self._list_result
+
+    def list_response_body(self, req_id):
+        """A complete ``tools/list`` JSON-RPC response as bytes; only the id is serialised per call"""
+        if self._list_json is None:
+            self._list_json = json.dumps(self.list_result(), ensure_ascii=False)
+        return f'{{"jsonrpc":"2.0","id":{json.dumps(req_id)},"result":{self._list_json}}}'.encode("utf-8")
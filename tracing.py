@@ -0,0 +1,143 @@
+# Optional span-based request tracing, exportable as JSON or Chrome trace events
+
+import contextvars
+import functools
+import inspect
+import os
+import time
+from collections import deque
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attributes", "start_ns", "end_ns", "children")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.children = []
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "attributes": self.attributes,
+            "duration_ms": round(self.duration_ms, 3),
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _SpanContext:
+    __slots__ = ("_tracer", "_span", "_token")
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._span = Span(name, attributes)
+
+    def __enter__(self):
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self._span
+        span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            span.attributes["error"] = repr(exc)
+        _current_span.reset(self._token)
+        parent = _current_span.get()
+        if parent is None:
+            self._tracer._finished.append(span)
+        else:
+            parent.children.append(span)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Collects nested spans per request while enabled; costs one attribute check when disabled.
+
+    ``span()`` opens a span under the current one, tracked through a
+    context variable so it follows awaits and tasks. A span opened with no
+    parent is a trace root. Finished traces go into a ring buffer of the last
+    ``max_traces``, exported by ``to_json()`` or ``to_chrome()``. The Chrome
+    format opens in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, enabled=False, max_traces=100):
+        self.enabled = enabled
+        self._finished = deque(maxlen=max_traces)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return _NOOP
+        return _SpanContext(self, name, attributes)
+
+    def traced(self, name=None):
+        """Decorator wrapping every call of a function, sync or async, in a span"""
+        def decorate(function):
+            span_name = name or function.__name__
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def traces(self):
+        return list(self._finished)
+
+    def clear(self):
+        self._finished.clear()
+
+    def to_json(self):
+        return [span.to_dict() for span in self._finished]
+
+    def to_chrome(self):
+        """Chrome trace event format; each trace gets its own row (tid)"""
+        pid = os.getpid()
+        events = []
+        for tid, root in enumerate(self._finished, 1):
+            stack = [root]
+            while stack:
+                span = stack.pop()
+                events.append({
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": ((span.end_ns or span.start_ns) - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": span.attributes,
+                })
+                stack.extend(span.children)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}